@@ -0,0 +1,436 @@
+"""
+Benchmark reprodutível do PDFHandler.
+
+Gera PDFs sintéticos, sobe um servidor SMTP local (sink) com latência e
+taxa de erros configuráveis e usa um resolvedor DNS simulado, exercitando
+o caminho real (watchdog → prontidão → fila → process_pdf → SMTP) sem
+tocar servidores de email reais.
+
+Exemplo:
+    python benchmark.py --files 200 --pages 5 --addresses 3 --workers 8
+"""
+
+import os
+import sys
+import json
+import time
+import re
+import random
+import shutil
+import asyncio
+import logging
+import argparse
+import tempfile
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import dns.resolver
+
+import main
+
+def make_pdf(path: str, pages: List[List[str]], padding: int = 0) -> None:
+    """
+    Grava um PDF mínimo com uma linha de texto por item de cada página.
+
+    Args:
+        path: Caminho do arquivo a criar
+        pages: Linhas de texto de cada página
+        padding: Bytes extras (stream não referenciado) para atingir o tamanho desejado
+    """
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        ("<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages))), len(pages))).encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, lines in enumerate(pages):
+        text = " ".join(f"({line}) '" for line in lines)
+        content = f"BT /F1 10 Tf 50 800 Td 12 TL {text} ET".encode("latin-1")
+        objects.append((f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                        f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>").encode())
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+    if padding > 0:
+        objects.append(b"<< /Length %d >>\nstream\n" % padding + os.urandom(padding) + b"\nendstream")
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n".encode() + obj + b"\nendobj\n"
+    xref = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        output += f"{offset:010d} 00000 n \n".encode()
+    output += (f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+               f"startxref\n{xref}\n%%EOF\n").encode()
+
+    with open(path, "wb") as f:
+        f.write(output)
+
+def synthetic_pages(pages: int, addresses: int, domains: int, invalid_ratio: float,
+                    rng: random.Random) -> List[List[str]]:
+    """Monta o texto das páginas com `addresses` emails espalhados entre elas."""
+    content = [[f"Documento sintetico - pagina {n + 1}", "Lorem ipsum dolor sit amet"]
+               for n in range(pages)]
+    for i in range(addresses):
+        if rng.random() < invalid_ratio:
+            domain = f"invalido{rng.randrange(domains)}.com"
+        else:
+            domain = f"cliente{rng.randrange(domains)}.com"
+        content[i % pages].append(f"Contato: usuario{rng.randrange(10 ** 6)}@{domain}")
+    return content
+
+class SMTPSink:
+    """
+    Servidor SMTP local que aceita e descarta mensagens (com PIPELINING e AUTH).
+    
+    Destinatários cuja parte local começa com "recusado" são rejeitados no RCPT TO (550).
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 error_rate: float = 0.0, pipelining: bool = True, seed: int = 0):
+        """
+        Inicializa o sink.
+
+        Args:
+            host: Endereço de escuta
+            port: Porta de escuta (0 escolhe uma livre)
+            latency: Atraso (s) aplicado antes de responder ao DATA
+            error_rate: Fração de mensagens recusadas com 451 (erro temporário)
+            pipelining: Anuncia a extensão PIPELINING
+            seed: Semente das falhas simuladas
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.error_rate = error_rate
+        self.pipelining = pipelining
+        self.rng = random.Random(seed)
+
+        self.messages = 0
+        self.recipients = 0
+        self.rejected = 0
+        self.connections = 0
+        self.bytes = 0
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="SMTPSink", daemon=True)
+        self._server = None
+
+    def start(self) -> "SMTPSink":
+        """Inicia o servidor em uma thread própria."""
+        self._thread.start()
+        self._server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self._handle, self.host, self.port), self._loop).result()
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    def stop(self) -> None:
+        """Encerra o servidor."""
+        self._loop.call_soon_threadsafe(self._server.close)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+
+        def reply(line: str) -> None:
+            writer.write(line.encode("ascii") + b"\r\n")
+
+        reply("220 benchmark sink")
+        await writer.drain()
+        recipients: List[str] = []
+
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            command = line.decode("utf-8", "replace").strip()
+            verb = command[:4].upper()
+
+            if verb == "EHLO":
+                reply("250-benchmark")
+                if self.pipelining:
+                    reply("250-PIPELINING")
+                reply("250 AUTH PLAIN LOGIN")
+            elif verb == "HELO":
+                reply("250 benchmark")
+            elif verb == "AUTH":
+                reply("235 autenticado")
+            elif verb == "MAIL":
+                recipients = []
+                reply("250 ok")
+            elif verb == "RCPT":
+                address = command[8:].strip().strip("<>")
+                if address.startswith("recusado"):
+                    reply("550 destinatario inexistente")
+                else:
+                    recipients.append(address)
+                    reply("250 ok")
+            elif verb == "DATA":
+                if not recipients:
+                    reply("554 nenhum destinatario")
+                    await writer.drain()
+                    continue
+                reply("354 envie os dados")
+                await writer.drain()
+                size = 0
+                while True:
+                    data = await reader.readline()
+                    if data in (b".\r\n", b""):
+                        break
+                    size += len(data)
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                if self.rng.random() < self.error_rate:
+                    self.rejected += 1
+                    reply("451 falha temporaria simulada")
+                else:
+                    self.messages += 1
+                    self.recipients += len(recipients)
+                    self.bytes += size
+                    reply("250 enfileirada")
+                recipients = []
+            elif verb in ("RSET", "NOOP"):
+                recipients = []
+                reply("250 ok")
+            elif verb == "QUIT":
+                reply("221 tchau")
+                await writer.drain()
+                break
+            else:
+                reply("502 comando desconhecido")
+            await writer.drain()
+        writer.close()
+
+class _StubAnswer(list):
+    """Resposta MX simulada com o TTL esperado pelo MXCache."""
+
+    class rrset:
+        ttl = 300
+
+class StubResolver:
+    """Resolvedor DNS simulado: domínios 'invalido*' não existem, os demais têm MX."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.queries = 0
+        self._lock = threading.Lock()
+
+    def resolve(self, domain: str, record_type: str) -> _StubAnswer:
+        with self._lock:
+            self.queries += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if domain.startswith("invalido"):
+            raise dns.resolver.NXDOMAIN()
+        return _StubAnswer([f"mx.{domain}"])
+
+def percentile(values: List[float], q: float) -> float:
+    """Percentil `q` (0-1) por ordenação simples."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def peak_rss_mb(children: bool = False) -> Optional[float]:
+    """Pico de memória residente (MB) do processo ou, com `children`, do maior
+    processo filho já encerrado (os workers de extração), quando disponível."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux informa em KB; macOS em bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def run_benchmark(args: argparse.Namespace) -> Dict[str, object]:
+    """Executa o benchmark e retorna o relatório."""
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix="automacao_bench_")
+    source = os.path.join(workdir, "origem")
+    monitor = os.path.join(workdir, "monitorada")
+    for folder in (source, monitor):
+        os.makedirs(folder)
+
+    sink = SMTPSink(latency=args.smtp_latency, error_rate=args.smtp_error_rate,
+                    pipelining=not args.no_pipelining, seed=args.seed).start()
+    logger = logging.getLogger("EmailAutomationBenchmark")
+    logger.setLevel(logging.INFO if args.verbose else logging.CRITICAL)
+    if not logger.handlers:
+        logger.addHandler(logging.StreamHandler())
+
+    # PDFs gerados fora da pasta monitorada e copiados para ela durante a medição
+    names = []
+    for i in range(args.files):
+        name = f"doc_{i:05d}.pdf"
+        pages = synthetic_pages(args.pages, args.addresses, args.domains, args.invalid_ratio, rng)
+        make_pdf(os.path.join(source, name), pages, padding=args.size_kb * 1024)
+        names.append(name)
+
+    handler = main.PDFHandler(
+        smtp_server="127.0.0.1", smtp_port=sink.port, email="benchmark@cliente0.com",
+        password="", monitor_folder=monitor,
+        sent_folder=os.path.join(workdir, "enviados"), error_folder=os.path.join(workdir, "erros"),
+        email_template=main.DEFAULT_EMAIL_TEMPLATE, error_template=main.DEFAULT_ERROR_TEMPLATE,
+        update_stats_callback=lambda *a: None, logger=logger,
+        workers=args.workers, smtp_pool_size=args.smtp_pool_size, smtp_engine=args.smtp_engine,
+        smtp_use_tls=False, extraction_processes=args.extraction_processes,
+        journal_path=os.path.join(workdir, "journal.db"), retry_base_delay=args.retry_delay,
+        observer_mode=args.observer_mode, recipient_batching=args.batching,
+        tracing=bool(args.trace), profiling=bool(args.trace), trace_path=args.trace)
+    handler.resolver = StubResolver(latency=args.dns_latency)
+
+    # Latência por arquivo: da chegada na pasta até o fim de process_pdf
+    dropped: Dict[str, float] = {}
+    latencies: List[float] = []
+    done = threading.Semaphore(0)
+    original_process = handler.process_pdf
+
+    def timed_process(pdf_path: str) -> None:
+        original_process(pdf_path)
+        if not os.path.exists(pdf_path):
+            latencies.append(time.perf_counter() - dropped[os.path.basename(pdf_path)])
+            done.release()
+
+    handler.process_pdf = timed_process
+
+    observer = None
+    started = time.perf_counter()
+    try:
+        # Os workers também são necessários no modo direct para as novas tentativas
+        handler.start_workers()
+        if args.mode == "watch":
+            observer = handler.create_observer()
+            observer.start()
+            for name in names:
+                dropped[name] = time.perf_counter()
+                shutil.copyfile(os.path.join(source, name), os.path.join(monitor, name))
+        else:
+            for name in names:
+                path = os.path.join(monitor, name)
+                shutil.copyfile(os.path.join(source, name), path)
+                dropped[name] = time.perf_counter()
+                handler.process_pdf(path)
+        for _ in names:
+            if not done.acquire(timeout=args.timeout):
+                raise TimeoutError("Tempo limite excedido aguardando o processamento")
+        elapsed = time.perf_counter() - started
+    finally:
+        if observer is not None:
+            observer.stop()
+            observer.join()
+        stage_metrics = handler.metrics.snapshot()["stages"]
+        handler.close()
+        if handler.extraction_executor is not None:
+            # Os filhos só entram em RUSAGE_CHILDREN depois de encerrados
+            handler.extraction_executor.shutdown(wait=True)
+        sink.stop()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "files": len(latencies),
+        "messages": sink.messages,
+        "smtp_connections": sink.connections,
+        "dns_queries": handler.resolver.queries,
+        "elapsed_s": round(elapsed, 3),
+        "files_per_min": round(len(latencies) / elapsed * 60, 1),
+        "messages_per_min": round(sink.messages / elapsed * 60, 1),
+        "latency_p50_ms": round(percentile(latencies, 0.5) * 1000, 1),
+        "latency_p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "peak_rss_mb": round(peak_rss_mb() or 0.0, 1),
+        "peak_rss_children_mb": round(peak_rss_mb(children=True) or 0.0, 1),
+        "stages_p50_ms": {stage: round(data["p50_seconds"] * 1000, 1)
+                          for stage, data in stage_metrics.items() if data["count"]},
+    }
+
+def legacy_extract(text: str) -> List[str]:
+    """Caminho de extração anterior: findall e revalidação sem deduplicação."""
+    found = re.findall(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', text)
+    return [email for email in found
+            if re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', email)]
+
+def synthetic_text(size_mb: float, addresses: int, repeats: int, rng: random.Random) -> str:
+    """Texto grande com endereços repetidos, alguns quebrados entre linhas."""
+    pool = [f"usuario{i}@Cliente{i % 7}.com.br" for i in range(addresses)]
+    filler = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. Valor: R$ 1.234,56.\n"
+    lines = []
+    size = 0
+    target = int(size_mb * 1024 * 1024)
+    while size < target:
+        line = filler * 4
+        if rng.random() < addresses * repeats / max(1, target // len(line)):
+            address = rng.choice(pool)
+            if rng.random() < 0.1:
+                address = address.replace("@", "@\n")
+            line += f"Contato: {address}.\n"
+        lines.append(line)
+        size += len(line)
+    return "".join(lines)
+
+def run_extraction_benchmark(args: argparse.Namespace) -> Dict[str, object]:
+    """Compara o extrator atual com o caminho anterior em um texto grande."""
+    text = synthetic_text(args.text_mb, args.addresses, args.repeats, random.Random(args.seed))
+    report: Dict[str, object] = {"text_mb": round(len(text) / (1024 * 1024), 2)}
+    for name, extract in (("legacy", legacy_extract), ("extractor", main.ADDRESS_EXTRACTOR.extract)):
+        samples = []
+        for _ in range(args.rounds):
+            started = time.perf_counter()
+            result = extract(text)
+            samples.append(time.perf_counter() - started)
+        report[f"{name}_ms"] = round(min(samples) * 1000, 1)
+        report[f"{name}_addresses"] = len(result)
+    report["speedup"] = round(report["legacy_ms"] / max(report["extractor_ms"], 1e-6), 2)
+    return report
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark do PDFHandler com SMTP e DNS locais")
+    parser.add_argument("--mode", choices=("watch", "direct", "extraction"), default="watch",
+                        help="watch: watchdog + workers; direct: process_pdf sequencial; "
+                             "extraction: compara a extração de endereços em texto grande")
+    parser.add_argument("--observer-mode", choices=("native", "polling"), default="native",
+                        help="Detecção no modo watch: eventos do sistema ou varredura")
+    parser.add_argument("--batching", choices=("off", "to", "bcc"), default="off",
+                        help="Agrupamento dos destinatários de cada PDF em uma mensagem")
+    parser.add_argument("--files", type=int, default=100, help="Número de PDFs")
+    parser.add_argument("--pages", type=int, default=3, help="Páginas por PDF")
+    parser.add_argument("--addresses", type=int, default=3, help="Emails por PDF")
+    parser.add_argument("--domains", type=int, default=5, help="Domínios distintos")
+    parser.add_argument("--invalid-ratio", type=float, default=0.0, help="Fração de emails com domínio inexistente")
+    parser.add_argument("--size-kb", type=int, default=0, help="Bytes extras (KB) em cada PDF")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--smtp-pool-size", type=int, default=3)
+    parser.add_argument("--smtp-engine", choices=("sync", "async"), default="sync")
+    parser.add_argument("--extraction-processes", type=int, default=2)
+    parser.add_argument("--smtp-latency", type=float, default=0.0, help="Latência (s) do sink SMTP")
+    parser.add_argument("--smtp-error-rate", type=float, default=0.0, help="Fração de respostas 451")
+    parser.add_argument("--no-pipelining", action="store_true", help="Não anuncia PIPELINING")
+    parser.add_argument("--dns-latency", type=float, default=0.0, help="Latência (s) do DNS simulado")
+    parser.add_argument("--retry-delay", type=float, default=0.5, help="Espera base (s) entre tentativas")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Tempo limite (s) por arquivo")
+    parser.add_argument("--text-mb", type=float, default=5.0, help="Tamanho do texto no modo extraction")
+    parser.add_argument("--repeats", type=int, default=40, help="Ocorrências de cada email no modo extraction")
+    parser.add_argument("--rounds", type=int, default=3, help="Repetições de cada medição no modo extraction")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="Imprime o relatório em JSON")
+    parser.add_argument("--trace", metavar="ARQUIVO",
+                        help="Grava os spans por arquivo (JSON Lines) e o perfil (.folded) das etapas")
+    parser.add_argument("--keep", action="store_true", help="Mantém a pasta temporária")
+    parser.add_argument("--verbose", action="store_true", help="Exibe os logs do PDFHandler")
+    return parser.parse_args(argv)
+
+def main_benchmark(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    report = run_extraction_benchmark(args) if args.mode == "extraction" else run_benchmark(args)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for key, value in report.items():
+            print(f"{key:<20} {value}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main_benchmark())
@@ -1,43 +1,2405 @@
+from __future__ import annotations
+
 import os
+import sys
+import signal
+import argparse
+import inspect
+import json
+import base64
+import binascii
+import errno
+import hashlib
+import mmap
+import sqlite3
 import time
 import re
 import logging
+import logging.handlers
+import shutil
 import threading
+import queue
+import asyncio
+import ssl
+import socket
+import copy
+import heapq
+import random
 import smtplib
 import PyPDF2
 import dns.resolver
 import dns.exception
-import customtkinter as ctk
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
+from email import encoders
+from email.generator import BytesGenerator
+from email.utils import getaddresses
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
 from email.mime.application import MIMEApplication
 from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
-from tkinter import messagebox, filedialog
-from typing import List, Optional, Tuple, Callable
+from watchdog.events import FileCreatedEvent, FileSystemEventHandler
+from typing import Dict, Iterator, List, Optional, Tuple, Callable
+
+# Pasta de dados persistentes da aplicação (diário de processamento, caches)
+APP_DATA_DIR = os.path.join(os.path.expanduser("~"), ".automacao_email")
+
+DEFAULT_EMAIL_TEMPLATE = """Olá,\n\nSegue em anexo o arquivo {nome_arquivo} conforme solicitado.\n\nAtenciosamente,\nSistema Automático de Envio de Emails"""
+
+DEFAULT_ERROR_TEMPLATE = """Olá,\n\nIdentificamos um problema ao processar o arquivo {nome_arquivo}:\n\n{erro}\n\nPor favor, verifique e tente novamente.\n\nAtenciosamente,\nSistema Automático de Envio de Emails"""
+
+# Intervalo (ms) entre atualizações das estatísticas na interface
+GUI_REFRESH_INTERVAL = 200
+
+# Padrão de endereço de email usado na extração e na validação
+EMAIL_PATTERN = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
+
+# A interface gráfica (customtkinter/tkinter) só é importada quando solicitada
+ctk = None
+messagebox = None
+filedialog = None
+
+def load_gui() -> None:
+    """Importa a pilha gráfica e configura o tema."""
+    global ctk, messagebox, filedialog
+    if ctk is not None:
+        return
+        
+    import customtkinter
+    from tkinter import messagebox as tk_messagebox, filedialog as tk_filedialog
+    
+    ctk, messagebox, filedialog = customtkinter, tk_messagebox, tk_filedialog
+    
+    # Configuração do tema
+    ctk.set_appearance_mode("System")
+    ctk.set_default_color_theme("blue")
+
+class LogHandler(logging.Handler):
+    """
+    Handler personalizado para exibir logs na interface gráfica.
+    
+    Os registros emitidos pelas threads de processamento são acumulados em
+    um buffer e inseridos no widget em lote, a cada `flush_interval` ms,
+    pelo event loop do Tk. O widget mantém apenas as últimas `max_lines`
+    linhas; o histórico completo fica no arquivo de log.
+    """
+    
+    def __init__(self, text_widget: ctk.CTkTextbox, flush_interval: int = 150,
+                 max_lines: int = 1000):
+        super().__init__()
+        self.text_widget = text_widget
+        self.flush_interval = flush_interval
+        self.max_lines = max_lines
+        self._buffer: deque = deque(maxlen=max_lines)
+        self._buffer_lock = threading.Lock()
+        self.text_widget.after(self.flush_interval, self._flush)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Adiciona a mensagem de log ao buffer do widget de texto."""
+        msg = self.format(record)
+        with self._buffer_lock:
+            self._buffer.append(msg)
+
+    def _flush(self) -> None:
+        """Insere de uma só vez as mensagens acumuladas e agenda o próximo ciclo."""
+        with self._buffer_lock:
+            messages, self._buffer = self._buffer, deque(maxlen=self.max_lines)
+            
+        if messages:
+            self.text_widget.configure(state="normal")
+            self.text_widget.insert("end", "\n".join(messages) + "\n")
+            
+            # Descarta as linhas mais antigas além do limite
+            lines = int(self.text_widget.index("end-1c").split(".")[0]) - 1
+            if lines > self.max_lines:
+                self.text_widget.delete("1.0", f"{lines - self.max_lines + 1}.0")
+                
+            self.text_widget.configure(state="disabled")
+            self.text_widget.see("end")
+            
+        self.text_widget.after(self.flush_interval, self._flush)
+
+def start_file_logging(logger: logging.Logger, log_path: str,
+                       formatter: logging.Formatter, max_bytes: int = 5 * 1024 * 1024,
+                       backup_count: int = 5) -> logging.handlers.QueueListener:
+    """
+    Grava o log em um arquivo com rotação por tamanho.
+    
+    O logger recebe apenas um QueueHandler (não bloqueante); a escrita em
+    disco acontece na thread do QueueListener retornado, que deve ser parado
+    ao encerrar a aplicação.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+    
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+    file_handler.setFormatter(formatter)
+    
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    
+    listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
+def rotated_log_files(log_path: str) -> List[str]:
+    """Arquivos de log existentes, do mais antigo ao mais recente."""
+    backups = []
+    index = 1
+    while os.path.exists(f"{log_path}.{index}"):
+        backups.append(f"{log_path}.{index}")
+        index += 1
+    files = list(reversed(backups))
+    if os.path.exists(log_path):
+        files.append(log_path)
+    return files
+
+class StatsCounter:
+    """Contadores de estatísticas atualizados de forma atômica por várias threads."""
+
+    def __init__(self):
+        self.processed = 0
+        self.sent = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def add(self, processed: int = 0, sent: int = 0, errors: int = 0) -> Tuple[int, int, int]:
+        """Soma os incrementos e retorna os totais atualizados."""
+        with self._lock:
+            self.processed += processed
+            self.sent += sent
+            self.errors += errors
+            return self.processed, self.sent, self.errors
+
+    def snapshot(self) -> Tuple[int, int, int]:
+        """Retorna os totais (processados, enviados, erros)."""
+        with self._lock:
+            return self.processed, self.sent, self.errors
+
+class Histogram:
+    """Histograma cumulativo de latências (segundos), no formato do Prometheus."""
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf"))
+
+    def __init__(self):
+        self.counts = [0] * len(self.BUCKETS)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        """Registra uma observação."""
+        for i, bound in enumerate(self.BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.total += value
+
+    def quantile(self, q: float) -> float:
+        """Estimativa do quantil `q` pelo limite superior do bucket correspondente."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.BUCKETS, self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound if bound != float("inf") else self.BUCKETS[-2]
+        return self.BUCKETS[-2]
+
+class Metrics:
+    """
+    Métricas do pipeline: histogramas de latência por etapa e medidores
+    (profundidade da fila, arquivos em processamento, cache MX...).
+    """
+
+    # Etapas instrumentadas
+    STAGES = ("detect_ready", "pdf_extraction", "dns_validation", "smtp_preflight",
+              "mime_build", "smtp_connect", "smtp_send")
+
+    def __init__(self):
+        self._histograms: Dict[str, Histogram] = {stage: Histogram() for stage in self.STAGES}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+        self._lock = threading.Lock()
+        # Rastreador opcional que recebe um span por etapa medida com timer
+        self.tracer: Optional[PipelineTracer] = None
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """Registra a duração de uma etapa."""
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        """Context manager que mede a duração do bloco como uma etapa."""
+        tracer = self.tracer
+        span = tracer.begin(stage) if tracer is not None and tracer.enabled else None
+        outcome = "ok"
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            outcome = type(e).__name__
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+            if span is not None:
+                tracer.end(span, outcome)
+
+    def gauge(self, name: str, read: Callable[[], float]) -> None:
+        """Registra um medidor lido sob demanda."""
+        self._gauges[name] = read
+
+    def _read_gauges(self) -> Dict[str, float]:
+        values = {}
+        for name, read in list(self._gauges.items()):
+            try:
+                values[name] = float(read())
+            except Exception:
+                values[name] = float("nan")
+        return values
+
+    def snapshot(self) -> Dict[str, object]:
+        """Retorna as métricas atuais como um dicionário serializável em JSON."""
+        with self._lock:
+            stages = {
+                stage: {
+                    "count": h.count,
+                    "sum_seconds": h.total,
+                    "p50_seconds": h.quantile(0.5),
+                    "p99_seconds": h.quantile(0.99),
+                }
+                for stage, h in self._histograms.items()
+            }
+        return {"timestamp": time.time(), "stages": stages, "gauges": self._read_gauges()}
+
+    def render_prometheus(self) -> str:
+        """Retorna as métricas no formato texto de exposição do Prometheus."""
+        lines = ["# TYPE automacao_stage_seconds histogram"]
+        with self._lock:
+            for stage, h in self._histograms.items():
+                cumulative = 0
+                for bound, count in zip(h.BUCKETS, h.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'automacao_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'automacao_stage_seconds_sum{{stage="{stage}"}} {h.total}')
+                lines.append(f'automacao_stage_seconds_count{{stage="{stage}"}} {h.count}')
+                
+        for name, value in self._read_gauges().items():
+            lines.append(f"# TYPE automacao_{name} gauge")
+            lines.append(f"automacao_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+class MetricsExporter:
+    """Expõe as métricas via HTTP (/metrics) e/ou grava snapshots JSON periódicos."""
+
+    def __init__(self, metrics: Metrics, logger: logging.Logger, port: int = 0,
+                 host: str = "127.0.0.1", json_path: Optional[str] = None,
+                 json_interval: float = 60.0):
+        """
+        Inicializa o exportador.
+
+        Args:
+            metrics: Métricas a exportar
+            logger: Objeto de logging
+            port: Porta HTTP local do endpoint /metrics (0 desativa)
+            host: Endereço de escuta do endpoint HTTP
+            json_path: Arquivo onde os snapshots JSON são gravados (None desativa)
+            json_interval: Intervalo (s) entre snapshots JSON
+        """
+        self.metrics = metrics
+        self.logger = logger
+        self.port = port
+        self.host = host
+        self.json_path = json_path
+        self.json_interval = json_interval
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        """Inicia o servidor HTTP e/ou a gravação periódica."""
+        self._stop.clear()
+        if self.port:
+            metrics = self.metrics
+
+            class _Handler(BaseHTTPRequestHandler):
+                def do_GET(self) -> None:
+                    if self.path.split("?")[0] != "/metrics":
+                        self.send_error(404)
+                        return
+                    body = metrics.render_prometheus().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format: str, *args) -> None:
+                    pass
+
+            try:
+                self._server = ThreadingHTTPServer((self.host, self.port), _Handler)
+            except OSError as e:
+                self.logger.error(f"Erro ao iniciar endpoint de métricas na porta {self.port}: {str(e)}")
+            else:
+                self._start_thread(self._server.serve_forever, "MetricsHTTP")
+                self.logger.info(f"Métricas disponíveis em http://{self.host}:{self.port}/metrics")
+                
+        if self.json_path:
+            self._start_thread(self._write_snapshots, "MetricsJSON")
+
+    def _start_thread(self, target: Callable[[], None], name: str) -> None:
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def write_snapshot(self) -> None:
+        """Grava um snapshot JSON das métricas de forma atômica."""
+        tmp_path = self.json_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.metrics.snapshot(), f)
+        os.replace(tmp_path, self.json_path)
+
+    def _write_snapshots(self) -> None:
+        while not self._stop.wait(self.json_interval):
+            try:
+                self.write_snapshot()
+            except OSError as e:
+                self.logger.error(f"Erro ao gravar métricas em {self.json_path}: {str(e)}")
+
+    def stop(self) -> None:
+        """Encerra o servidor HTTP e a gravação periódica (gravando um último snapshot)."""
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        for thread in self._threads:
+            thread.join(5)
+        self._threads = []
+        if self.json_path:
+            try:
+                self.write_snapshot()
+            except OSError as e:
+                self.logger.error(f"Erro ao gravar métricas em {self.json_path}: {str(e)}")
+
+class PipelineTracer:
+    """
+    Rastreamento do pipeline ativado em tempo de execução.
+    
+    Cada etapa medida por Metrics.timer vira um span JSON (arquivo, etapa,
+    início, fim, bytes, resultado) gravado em um arquivo JSON Lines. Com o
+    perfil ativado, uma thread amostra periodicamente as pilhas das threads
+    que estão dentro de uma etapa e, ao parar, grava as pilhas agregadas no
+    formato "folded" (flamegraph.pl, speedscope). Enquanto o perfil está
+    ativo, a extração de texto roda nas threads de processamento em vez do
+    pool de processos, e as threads de consulta DNS entram no perfil como
+    "dns_validation". Desativado, o custo por etapa é a leitura de um atributo.
+    """
+
+    # Profundidade máxima das pilhas amostradas
+    MAX_STACK_DEPTH = 64
+
+    def __init__(self, logger: logging.Logger, trace_path: str,
+                 profile_interval: float = 0.005):
+        """
+        Inicializa o rastreador (desativado).
+
+        Args:
+            logger: Objeto de logging
+            trace_path: Arquivo JSON Lines dos spans; o perfil vai para o mesmo
+                caminho com a extensão .folded
+            profile_interval: Intervalo (s) entre amostras do perfil
+        """
+        self.logger = logger
+        self.trace_path = trace_path
+        self.profile_path = os.path.splitext(trace_path)[0] + ".folded"
+        self.profile_interval = profile_interval
+        self.enabled = False
+        self.profiling = False
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._file = None
+        # Etapa em curso por thread, lida pelo amostrador
+        self._active: Dict[int, str] = {}
+        self._samples: Dict[str, int] = {}
+        self._sampler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self, profile: bool = False) -> None:
+        """Ativa a gravação dos spans e, opcionalmente, o perfil por amostragem."""
+        with self._lock:
+            if self.enabled:
+                return
+            directory = os.path.dirname(self.trace_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.trace_path, "a", encoding="utf-8")
+            self._samples = {}
+            self.profiling = profile
+            self.enabled = True
+            
+        if profile:
+            self._stop.clear()
+            self._sampler = threading.Thread(target=self._sample_loop, name="TraceSampler",
+                                             daemon=True)
+            self._sampler.start()
+        self.logger.info(f"Rastreamento ativado: {self.trace_path}"
+                         + (" (com perfil)" if profile else ""))
+
+    def stop(self) -> None:
+        """Desativa o rastreamento, fecha o arquivo de spans e grava o perfil."""
+        with self._lock:
+            if not self.enabled:
+                return
+            self.enabled = False
+        
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+            self._sampler = None
+            
+        with self._lock:
+            self._file.close()
+            self._file = None
+            self._active.clear()
+            samples, self._samples = self._samples, {}
+            
+        if self.profiling:
+            self.profiling = False
+            self._write_profile(samples)
+        self.logger.info("Rastreamento desativado")
+
+    def toggle(self, profile: bool = False) -> bool:
+        """Alterna o rastreamento e retorna se ele ficou ativo."""
+        if self.enabled:
+            self.stop()
+        else:
+            self.start(profile)
+        return self.enabled
+
+    @contextmanager
+    def document(self, pdf_path: str) -> Iterator[None]:
+        """Associa as etapas executadas no bloco ao arquivo e grava um span do documento."""
+        self._local.file = None
+        if not self.enabled:
+            yield
+            return
+            
+        try:
+            size = os.path.getsize(pdf_path)
+        except OSError:
+            size = 0
+        self._local.file = pdf_path
+        self._local.bytes = size
+        self._local.outcome = "ok"
+        span = self.begin("document")
+        try:
+            yield
+        except BaseException as e:
+            self._local.outcome = type(e).__name__
+            raise
+        finally:
+            self.end(span, self._local.outcome)
+            self._local.file = None
+            with self._lock:
+                if self._file is not None:
+                    self._file.flush()
+
+    def run_as(self, stage: str, function: Callable, *args):
+        """
+        Executa a função marcando a thread atual como dentro da etapa.
+        
+        Para trabalho delegado a outros pools (ex.: consultas DNS), cujas
+        threads não abrem spans mas devem aparecer no perfil.
+        """
+        if not self.profiling:
+            return function(*args)
+        ident = threading.get_ident()
+        previous = self._active.get(ident)
+        self._active[ident] = stage
+        try:
+            return function(*args)
+        finally:
+            if previous is None:
+                self._active.pop(ident, None)
+            else:
+                self._active[ident] = previous
+
+    def annotate(self, outcome: str) -> None:
+        """Define o resultado registrado no span do documento em curso."""
+        if getattr(self._local, "file", None) is not None:
+            self._local.outcome = outcome
+
+    def begin(self, stage: str) -> Tuple[str, float, float, Optional[str]]:
+        """Abre um span da etapa na thread atual."""
+        ident = threading.get_ident()
+        previous = self._active.get(ident)
+        self._active[ident] = stage
+        return stage, time.time(), time.perf_counter(), previous
+
+    def end(self, span: Tuple[str, float, float, Optional[str]], outcome: str) -> None:
+        """Fecha um span aberto por begin e grava o registro."""
+        stage, started, perf_started, previous = span
+        ident = threading.get_ident()
+        if previous is None:
+            self._active.pop(ident, None)
+        else:
+            self._active[ident] = previous
+            
+        duration = time.perf_counter() - perf_started
+        pdf_path = getattr(self._local, "file", None)
+        record = {
+            "file": pdf_path,
+            "stage": stage,
+            "start": started,
+            "end": started + duration,
+            "duration": duration,
+            "bytes": self._local.bytes if pdf_path is not None else None,
+            "outcome": outcome,
+            "thread": threading.current_thread().name,
+        }
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line)
+
+    def _sample_loop(self) -> None:
+        """Amostra as pilhas das threads que estão dentro de uma etapa."""
+        while not self._stop.wait(self.profile_interval):
+            frames = sys._current_frames()
+            for ident, stage in list(self._active.items()):
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None and len(stack) < self.MAX_STACK_DEPTH:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                if not stack:
+                    continue
+                key = ";".join([stage] + stack[::-1])
+                self._samples[key] = self._samples.get(key, 0) + 1
+
+    def _write_profile(self, samples: Dict[str, int]) -> None:
+        """Grava as pilhas agregadas e registra as funções com mais amostras."""
+        if not samples:
+            self.logger.info("Perfil sem amostras: nenhuma etapa executada durante o rastreamento")
+            return
+        try:
+            with open(self.profile_path, "w", encoding="utf-8") as f:
+                for key, count in sorted(samples.items()):
+                    f.write(f"{key} {count}\n")
+        except OSError as e:
+            self.logger.error(f"Erro ao gravar perfil em {self.profile_path}: {str(e)}")
+            return
+            
+        leaves: Dict[str, int] = {}
+        for key, count in samples.items():
+            stage, _, rest = key.partition(";")
+            leaf = f"{stage} {rest.rsplit(';', 1)[-1]}"
+            leaves[leaf] = leaves.get(leaf, 0) + count
+        total = sum(samples.values())
+        top = sorted(leaves.items(), key=lambda item: item[1], reverse=True)[:5]
+        summary = ", ".join(f"{leaf} {count * 100 / total:.0f}%" for leaf, count in top)
+        self.logger.info(f"Perfil gravado em {self.profile_path} ({total} amostras): {summary}")
+
+class SMTPConnectionPool:
+    """Pool de conexões SMTP autenticadas e reutilizáveis."""
+
+    def __init__(self, smtp_server: str, smtp_port: int, email: str, password: str,
+                 size: int = 3, idle_timeout: float = 60.0, timeout: float = 30.0,
+                 use_tls: bool = True, metrics: Optional[Metrics] = None):
+        """
+        Inicializa o pool de conexões SMTP.
+
+        Args:
+            smtp_server: Servidor SMTP para envio de emails
+            smtp_port: Porta do servidor SMTP
+            email: Email usado na autenticação
+            password: Senha do email
+            size: Número máximo de conexões simultâneas
+            idle_timeout: Tempo (s) após o qual uma conexão ociosa é descartada
+            timeout: Timeout (s) das operações de rede
+            use_tls: Usa STARTTLS antes da autenticação
+            metrics: Métricas onde o tempo de conexão/autenticação é registrado
+        """
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.email = email
+        self.password = password
+        self.size = max(1, size)
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.use_tls = use_tls
+        self.metrics = metrics or Metrics()
+
+        self._idle: List[Tuple[smtplib.SMTP, float]] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._closed = False
+
+    def _connect(self) -> smtplib.SMTP:
+        """Abre uma nova conexão com STARTTLS e LOGIN."""
+        with self.metrics.timer("smtp_connect"):
+            server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=self.timeout)
+            try:
+                if self.use_tls:
+                    server.starttls()
+                if self.password:
+                    server.login(self.email, self.password)
+            except Exception:
+                self._quit(server)
+                raise
+        return server
+
+    @staticmethod
+    def _quit(server: smtplib.SMTP) -> None:
+        """Encerra uma conexão ignorando falhas de rede."""
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _is_alive(server: smtplib.SMTP) -> bool:
+        """Verifica a saúde da conexão com um comando NOOP."""
+        try:
+            return server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def acquire(self) -> smtplib.SMTP:
+        """Obtém uma conexão saudável do pool, reconectando se necessário."""
+        if self._closed:
+            raise RuntimeError("Pool de conexões SMTP encerrado")
+
+        self._slots.acquire()
+        try:
+            while True:
+                with self._lock:
+                    if not self._idle:
+                        break
+                    server, last_used = self._idle.pop()
+
+                # Conexões ociosas há muito tempo provavelmente já foram derrubadas pelo servidor
+                if time.monotonic() - last_used > self.idle_timeout or not self._is_alive(server):
+                    self._quit(server)
+                    continue
+                return server
+
+            return self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, server: smtplib.SMTP, discard: bool = False) -> None:
+        """Devolve uma conexão ao pool ou a descarta em caso de falha."""
+        try:
+            if discard or self._closed:
+                self._quit(server)
+            else:
+                with self._lock:
+                    self._idle.append((server, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self) -> Iterator[smtplib.SMTP]:
+        """Context manager que empresta uma conexão e a devolve ao final."""
+        server = self.acquire()
+        try:
+            yield server
+        except (smtplib.SMTPServerDisconnected, OSError):
+            self.release(server, discard=True)
+            raise
+        except BaseException:
+            # Erros do protocolo podem deixar a transação pela metade
+            try:
+                server.rset()
+                self.release(server)
+            except Exception:
+                self.release(server, discard=True)
+            raise
+        else:
+            self.release(server)
+
+    def send_message(self, msg: MIMEMultipart,
+                     to_addrs: Optional[List[str]] = None) -> Dict[str, Tuple[int, bytes]]:
+        """
+        Envia uma mensagem, reconectando de forma transparente se a conexão cair.
+        
+        Retorna os destinatários recusados no RCPT TO; to_addrs substitui os
+        destinatários do envelope obtidos dos cabeçalhos.
+        """
+        try:
+            with self.connection() as server:
+                return server.send_message(msg, to_addrs=to_addrs)
+        except smtplib.SMTPServerDisconnected:
+            # A conexão caiu entre o health check e o envio: tenta uma única vez em uma nova
+            with self.connection() as server:
+                return server.send_message(msg, to_addrs=to_addrs)
+
+    def verify_recipients(self, sender: str, recipients: List[str]) -> Dict[str, Tuple[int, bytes]]:
+        """
+        Consulta o servidor com MAIL FROM/RCPT TO, sem enviar dados, e
+        retorna a resposta ao RCPT de cada destinatário.
+        
+        A transação é descartada com RSET e a conexão volta ao pool.
+        """
+        def verify(server: smtplib.SMTP) -> Dict[str, Tuple[int, bytes]]:
+            code, reply = server.mail(sender)
+            try:
+                if code != 250:
+                    raise smtplib.SMTPSenderRefused(code, reply, sender)
+                return {recipient: server.rcpt(recipient) for recipient in recipients}
+            finally:
+                server.rset()
+        
+        try:
+            with self.connection() as server:
+                return verify(server)
+        except smtplib.SMTPServerDisconnected:
+            with self.connection() as server:
+                return verify(server)
+
+    def close(self) -> None:
+        """Fecha todas as conexões ociosas e impede novos empréstimos."""
+        self._closed = True
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            self._quit(server)
+
+class AsyncSMTPDelivery:
+    """
+    Motor de envio assíncrono (asyncio) com várias sessões SMTP autenticadas.
+    
+    Oferece o mesmo contrato de SMTPConnectionPool.send_message, podendo ser
+    chamado simultaneamente por várias threads. Quando o servidor anuncia
+    PIPELINING, MAIL FROM, RCPT TO e DATA são enviados em um único lote.
+    """
+
+    def __init__(self, smtp_server: str, smtp_port: int, email: str, password: str,
+                 sessions: int = 4, idle_timeout: float = 60.0, timeout: float = 30.0,
+                 use_tls: bool = True, logger: Optional[logging.Logger] = None,
+                 metrics: Optional[Metrics] = None):
+        """
+        Inicializa o motor de envio e sua thread com o event loop.
+
+        Args:
+            smtp_server: Servidor SMTP para envio de emails
+            smtp_port: Porta do servidor SMTP (465 usa TLS implícito)
+            email: Email usado na autenticação
+            password: Senha do email
+            sessions: Número máximo de sessões SMTP simultâneas
+            idle_timeout: Tempo (s) após o qual uma sessão ociosa é descartada
+            timeout: Timeout (s) das operações de rede
+            use_tls: Usa STARTTLS (ou TLS implícito na porta 465)
+            logger: Objeto de logging para as latências de envio
+            metrics: Métricas onde o tempo de conexão/autenticação é registrado
+        """
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.email = email
+        self.password = password
+        self.sessions = max(1, sessions)
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.use_tls = use_tls
+        self.logger = logger or logging.getLogger('EmailAutomation')
+        self.local_hostname = socket.getfqdn() or "localhost"
+        self.metrics = metrics or Metrics()
+
+        # Latência (s) das últimas mensagens entregues
+        self.latencies: deque = deque(maxlen=1000)
+
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter, set, float]] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="AsyncSMTP", daemon=True)
+        self._thread.start()
+
+    async def _read_reply(self, reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+        """Lê uma resposta SMTP (possivelmente multilinha)."""
+        lines = []
+        while True:
+            line = await asyncio.wait_for(reader.readline(), self.timeout)
+            if not line:
+                raise smtplib.SMTPServerDisconnected("Conexão encerrada pelo servidor")
+            lines.append(line[4:].strip())
+            if line[3:4] != b"-":
+                try:
+                    return int(line[:3]), b"\n".join(lines)
+                except ValueError:
+                    raise smtplib.SMTPResponseException(-1, line.strip())
+
+    async def _command(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                       line: str) -> Tuple[int, bytes]:
+        """Envia um comando e aguarda sua resposta."""
+        writer.write(line.encode("ascii") + b"\r\n")
+        await writer.drain()
+        return await self._read_reply(reader)
+
+    async def _ehlo(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> set:
+        """Envia EHLO e retorna as extensões anunciadas pelo servidor."""
+        code, reply = await self._command(reader, writer, f"EHLO {self.local_hostname}")
+        if code != 250:
+            raise smtplib.SMTPHeloError(code, reply)
+        return {line.split()[0].upper().decode("ascii", "replace")
+                for line in reply.split(b"\n")[1:] if line}
+
+    async def _open_session(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter, set]:
+        """Abre uma sessão: conexão, TLS e autenticação."""
+        started = time.perf_counter()
+        implicit_tls = self.use_tls and self.smtp_port == 465
+        context = ssl.create_default_context() if self.use_tls else None
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.smtp_server, self.smtp_port,
+                                    ssl=context if implicit_tls else None),
+            self.timeout)
+        try:
+            code, reply = await self._read_reply(reader)
+            if code != 220:
+                raise smtplib.SMTPConnectError(code, reply)
+                
+            extensions = await self._ehlo(reader, writer)
+            if self.use_tls and not implicit_tls:
+                if "STARTTLS" not in extensions:
+                    raise smtplib.SMTPNotSupportedError("O servidor não suporta STARTTLS")
+                code, reply = await self._command(reader, writer, "STARTTLS")
+                if code != 220:
+                    raise smtplib.SMTPResponseException(code, reply)
+                await writer.start_tls(context, server_hostname=self.smtp_server)
+                extensions = await self._ehlo(reader, writer)
+                
+            if self.password:
+                await self._login(reader, writer, extensions)
+            self.metrics.observe("smtp_connect", time.perf_counter() - started)
+            return reader, writer, extensions
+        except BaseException:
+            writer.close()
+            raise
+
+    async def _login(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                     extensions: set) -> None:
+        """Autentica com AUTH PLAIN (ou AUTH LOGIN)."""
+        if "AUTH" not in extensions:
+            raise smtplib.SMTPNotSupportedError("O servidor não suporta AUTH")
+            
+        plain = base64.b64encode(f"\0{self.email}\0{self.password}".encode("utf-8")).decode("ascii")
+        code, reply = await self._command(reader, writer, f"AUTH PLAIN {plain}")
+        if code == 504:
+            code, reply = await self._command(reader, writer, "AUTH LOGIN")
+            for value in (self.email, self.password):
+                if code != 334:
+                    break
+                code, reply = await self._command(
+                    reader, writer, base64.b64encode(value.encode("utf-8")).decode("ascii"))
+        if code != 235:
+            raise smtplib.SMTPAuthenticationError(code, reply)
+
+    async def _acquire(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter, set]:
+        """Obtém uma sessão ociosa válida ou abre uma nova."""
+        while self._idle:
+            reader, writer, extensions, last_used = self._idle.pop()
+            if time.monotonic() - last_used <= self.idle_timeout and not writer.is_closing():
+                return reader, writer, extensions
+            writer.close()
+        return await self._open_session()
+
+    @staticmethod
+    def _flatten(msg: MIMEMultipart,
+                 to_addrs: Optional[List[str]] = None) -> Tuple[str, List[str], bytes]:
+        """Serializa a mensagem como smtplib.send_message (remetente, destinatários, dados)."""
+        from_addr = getaddresses([msg['From']])[0][1]
+        if to_addrs is None:
+            to_addrs = [addr for _, addr in getaddresses(
+                msg.get_all('To', []) + msg.get_all('Cc', []) + msg.get_all('Bcc', []))]
+        
+        if msg['Bcc'] is not None:
+            # Cópia rasa: a remoção do cabeçalho não altera a mensagem original
+            msg = copy.copy(msg)
+            del msg['Bcc']
+            
+        buffer = BytesIO()
+        BytesGenerator(buffer, policy=msg.policy.clone(linesep="\r\n")).flatten(msg)
+        data = re.sub(rb'(?m)^\.', b'..', buffer.getvalue())
+        if not data.endswith(b"\r\n"):
+            data += b"\r\n"
+        return from_addr, to_addrs, data + b".\r\n"
+
+    async def _transaction(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                           extensions: set, from_addr: str, to_addrs: List[str],
+                           data: bytes) -> Dict[str, Tuple[int, bytes]]:
+        """Executa MAIL/RCPT/DATA, em lote quando o servidor suporta PIPELINING."""
+        commands = [f"MAIL FROM:<{from_addr}>"] + [f"RCPT TO:<{addr}>" for addr in to_addrs]
+        
+        if "PIPELINING" in extensions:
+            writer.write(b"".join(c.encode("ascii") + b"\r\n" for c in commands + ["DATA"]))
+            await writer.drain()
+            replies = [await self._read_reply(reader) for _ in range(len(commands) + 1)]
+            mail_reply, rcpt_replies, data_reply = replies[0], replies[1:-1], replies[-1]
+        else:
+            mail_reply = await self._command(reader, writer, commands[0])
+            rcpt_replies = []
+            if mail_reply[0] == 250:
+                rcpt_replies = [await self._command(reader, writer, c) for c in commands[1:]]
+            # DATA ainda não enviado
+            data_reply = (0, b"")
+        
+        if mail_reply[0] != 250:
+            await self._reset(reader, writer, data_reply)
+            raise smtplib.SMTPSenderRefused(mail_reply[0], mail_reply[1], from_addr)
+            
+        refused = {addr: reply for addr, reply in zip(to_addrs, rcpt_replies)
+                   if reply[0] not in (250, 251)}
+        if len(refused) == len(to_addrs):
+            await self._reset(reader, writer, data_reply)
+            raise smtplib.SMTPRecipientsRefused(refused)
+            
+        if data_reply[0] == 0:
+            data_reply = await self._command(reader, writer, "DATA")
+        if data_reply[0] != 354:
+            await self._command(reader, writer, "RSET")
+            raise smtplib.SMTPDataError(data_reply[0], data_reply[1])
+            
+        writer.write(data)
+        await writer.drain()
+        code, reply = await self._read_reply(reader)
+        if code != 250:
+            raise smtplib.SMTPDataError(code, reply)
+        return refused
+
+    async def _reset(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                     data_reply: Tuple[int, bytes]) -> None:
+        """Aborta a transação atual; se DATA foi aceito em lote, encerra-o vazio antes."""
+        if data_reply[0] == 354:
+            writer.write(b".\r\n")
+            await writer.drain()
+            await self._read_reply(reader)
+        await self._command(reader, writer, "RSET")
+
+    async def _send(self, from_addr: str, to_addrs: List[str],
+                    data: bytes) -> Dict[str, Tuple[int, bytes]]:
+        """Envia uma mensagem já serializada usando uma sessão do pool."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.sessions)
+            
+        async with self._slots:
+            started = time.perf_counter()
+            reader, writer, extensions = await self._acquire()
+            try:
+                refused = await self._transaction(reader, writer, extensions, from_addr, to_addrs, data)
+            except (smtplib.SMTPServerDisconnected, OSError, asyncio.TimeoutError):
+                writer.close()
+                raise
+            except smtplib.SMTPRecipientsRefused:
+                self._idle.append((reader, writer, extensions, time.monotonic()))
+                raise
+            except BaseException:
+                writer.close()
+                raise
+                
+            self._idle.append((reader, writer, extensions, time.monotonic()))
+            latency = time.perf_counter() - started
+            self.latencies.append(latency)
+            self.logger.debug(f"Mensagem para {', '.join(to_addrs)} entregue em {latency * 1000:.0f} ms")
+            return refused
+
+    def send_message(self, msg: MIMEMultipart,
+                     to_addrs: Optional[List[str]] = None) -> Dict[str, Tuple[int, bytes]]:
+        """Envia uma mensagem (bloqueia a thread chamadora até a resposta do servidor)."""
+        # Serializada na thread chamadora: com anexos grandes, a geração MIME
+        # no event loop pararia todas as outras sessões
+        envelope = self._flatten(msg, to_addrs)
+        future = asyncio.run_coroutine_threadsafe(self._send(*envelope), self._loop)
+        try:
+            return future.result()
+        except smtplib.SMTPServerDisconnected:
+            # Sessão ociosa derrubada pelo servidor: tenta uma única vez em uma nova
+            return asyncio.run_coroutine_threadsafe(self._send(*envelope), self._loop).result()
+
+    def latency_stats(self) -> Dict[str, float]:
+        """Retorna estatísticas (ms) das latências de envio recentes."""
+        samples = sorted(self.latencies)
+        if not samples:
+            return {"count": 0, "avg_ms": 0.0, "p50_ms": 0.0, "p99_ms": 0.0}
+        return {
+            "count": len(samples),
+            "avg_ms": sum(samples) / len(samples) * 1000,
+            "p50_ms": samples[len(samples) // 2] * 1000,
+            "p99_ms": samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000,
+        }
+
+    async def _close_sessions(self) -> None:
+        """Encerra as sessões ociosas com QUIT."""
+        idle, self._idle = self._idle, []
+        for reader, writer, _, _ in idle:
+            try:
+                await asyncio.wait_for(self._command(reader, writer, "QUIT"), 5)
+            except Exception:
+                pass
+            writer.close()
+
+    def close(self) -> None:
+        """Fecha as sessões e encerra o event loop."""
+        if not self._loop.is_running():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._close_sessions(), self._loop).result(10)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(10)
+        self._loop.close()
+
+class TokenBucket:
+    """Balde de fichas: permite `rate` operações por segundo com rajadas de até `capacity`."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        """Repõe as fichas acumuladas desde a última atualização."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Tempo (s) até haver uma ficha disponível (0 se já houver)."""
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+class SendScheduler:
+    """
+    Controla o ritmo de envio: limite global de mensagens por segundo, limite
+    por domínio de destino e número máximo de envios simultâneos.
+    
+    Mensagens que excedem os limites aguardam em uma fila FIFO em vez de
+    falhar; uma mensagem retida pelo limite do seu domínio não bloqueia as
+    mensagens de outros domínios que estão atrás dela.
+    """
+
+    def __init__(self, global_rate: float = 0.0, domain_rate: float = 0.0,
+                 max_concurrent: int = 0):
+        """
+        Inicializa o escalonador.
+
+        Args:
+            global_rate: Mensagens por segundo no total (0 = sem limite)
+            domain_rate: Mensagens por segundo para cada domínio de destino (0 = sem limite)
+            max_concurrent: Envios simultâneos permitidos (0 = sem limite)
+        """
+        self.global_rate = global_rate
+        self.domain_rate = domain_rate
+        self.max_concurrent = max_concurrent
+
+        self._global = TokenBucket(global_rate) if global_rate > 0 else None
+        self._domains: Dict[str, TokenBucket] = {}
+        self._waiting: deque = deque()
+        self._active = 0
+        self._cond = threading.Condition()
+
+    @property
+    def enabled(self) -> bool:
+        """Indica se algum limite está configurado."""
+        return self.global_rate > 0 or self.domain_rate > 0 or self.max_concurrent > 0
+
+    def _domain_bucket(self, domain: str) -> Optional[TokenBucket]:
+        if self.domain_rate <= 0:
+            return None
+        bucket = self._domains.get(domain)
+        if bucket is None:
+            bucket = self._domains[domain] = TokenBucket(self.domain_rate)
+        return bucket
+
+    def acquire(self, *domains: str) -> None:
+        """
+        Aguarda até que uma mensagem para os domínios possa ser enviada.
+        
+        Uma mensagem com destinatários em vários domínios consome uma ficha
+        de cada domínio (e uma única ficha do limite global).
+        """
+        ticket = (object(), tuple(dict.fromkeys(domain.lower() for domain in domains)))
+        with self._cond:
+            self._waiting.append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    delay = self._try_dispatch(ticket, now)
+                    if delay == 0:
+                        return
+                    self._cond.wait(delay)
+            finally:
+                self._cond.notify_all()
+
+    def _try_dispatch(self, ticket: tuple, now: float) -> Optional[float]:
+        """
+        Tenta liberar o envio do ticket; retorna 0 se liberado ou o tempo de
+        espera sugerido (None aguarda uma liberação de vaga).
+        """
+        if self.max_concurrent > 0 and self._active >= self.max_concurrent:
+            return None
+            
+        if self._global is not None:
+            self._global.refill(now)
+            if self._global.wait_time() > 0:
+                return self._global.wait_time()
+        
+        # O primeiro da fila com ficha disponível em todos os seus domínios é o próximo a sair
+        domain_wait = None
+        for waiting in self._waiting:
+            buckets = [bucket for bucket in map(self._domain_bucket, waiting[1]) if bucket is not None]
+            wait = 0.0
+            for bucket in buckets:
+                bucket.refill(now)
+                wait = max(wait, bucket.wait_time())
+            if wait > 0:
+                if waiting is ticket:
+                    domain_wait = wait
+                continue
+            if waiting is not ticket:
+                return domain_wait
+                
+            self._waiting.remove(ticket)
+            if self._global is not None:
+                self._global.tokens -= 1
+            for bucket in buckets:
+                bucket.tokens -= 1
+            self._active += 1
+            return 0
+        return domain_wait
+
+    def release(self) -> None:
+        """Libera a vaga de envio ocupada por acquire()."""
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, *domains: str) -> Iterator[None]:
+        """Context manager que envolve um envio aos domínios respeitando os limites."""
+        if not self.enabled:
+            yield
+            return
+        self.acquire(*domains)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def queued(self) -> int:
+        """Número de mensagens aguardando liberação."""
+        with self._cond:
+            return len(self._waiting)
+
+class MXCache:
+    """Cache LRU em memória dos resultados de consultas MX, com TTL por entrada."""
+
+    def __init__(self, max_size: int = 1024, negative_ttl: float = 300.0,
+                 min_ttl: float = 60.0, max_ttl: float = 86400.0,
+                 persist_path: Optional[str] = None):
+        """
+        Inicializa o cache de registros MX.
+
+        Args:
+            max_size: Número máximo de domínios mantidos (os menos usados saem primeiro)
+            negative_ttl: Tempo (s) de validade de respostas negativas (NXDOMAIN, NoAnswer)
+            min_ttl: Limite inferior (s) aplicado ao TTL das respostas positivas
+            max_ttl: Limite superior (s) aplicado ao TTL das respostas positivas
+            persist_path: Arquivo JSON opcional para manter o cache entre execuções
+        """
+        self.max_size = max(1, max_size)
+        self.negative_ttl = negative_ttl
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.persist_path = persist_path
+
+        # domínio -> (válido, expira_em, motivo)
+        self._entries: "OrderedDict[str, Tuple[bool, float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if persist_path:
+            self.load()
+
+    def get(self, domain: str) -> Optional[Tuple[bool, str]]:
+        """Retorna (válido, motivo) do domínio se houver entrada não expirada."""
+        domain = domain.lower()
+        with self._lock:
+            entry = self._entries.get(domain)
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    del self._entries[domain]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(domain)
+            self.hits += 1
+            return entry[0], entry[2]
+
+    def put(self, domain: str, valid: bool, ttl: Optional[float] = None, reason: str = "") -> None:
+        """Armazena o resultado de uma consulta; respostas positivas usam o TTL do DNS."""
+        if valid:
+            ttl = min(max(ttl if ttl is not None else self.min_ttl, self.min_ttl), self.max_ttl)
+        else:
+            ttl = self.negative_ttl
+
+        with self._lock:
+            self._entries[domain.lower()] = (valid, time.time() + ttl, reason)
+            self._entries.move_to_end(domain.lower())
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        """Retorna os contadores de acertos/erros e a taxa de acerto do cache."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def load(self) -> None:
+        """Carrega do disco as entradas ainda válidas."""
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            now = time.time()
+            with self._lock:
+                for domain, (valid, expires, reason) in data.items():
+                    if expires > now:
+                        self._entries[domain] = (bool(valid), float(expires), reason)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        except (OSError, ValueError, TypeError):
+            # Um cache corrompido não deve impedir a inicialização
+            self._entries.clear()
+
+    def save(self) -> None:
+        """Grava o cache em disco de forma atômica."""
+        if not self.persist_path:
+            return
+        with self._lock:
+            data = {domain: list(entry) for domain, entry in self._entries.items()}
+        tmp_path = self.persist_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.persist_path)
+
+class ProcessingJournal:
+    """
+    Diário persistente (SQLite em modo WAL) do processamento de arquivos.
+    
+    Registra o hash do conteúdo de cada PDF, sua situação e os destinatários
+    que já receberam o arquivo, permitindo retomar o trabalho após uma queda
+    sem reenviar emails.
+    """
+
+    def __init__(self, db_path: str = ":memory:"):
+        """
+        Abre (ou cria) o diário.
+
+        Args:
+            db_path: Caminho do banco SQLite (":memory:" mantém o diário apenas em memória)
+        """
+        self.db_path = db_path
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                hash TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                status TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS files_path ON files (path);
+            CREATE TABLE IF NOT EXISTS deliveries (
+                hash TEXT NOT NULL,
+                recipient TEXT NOT NULL,
+                sent_at REAL NOT NULL,
+                PRIMARY KEY (hash, recipient)
+            );
+            CREATE TABLE IF NOT EXISTS retries (
+                hash TEXT NOT NULL,
+                recipient TEXT NOT NULL,
+                path TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                next_attempt REAL NOT NULL,
+                last_error TEXT NOT NULL,
+                PRIMARY KEY (hash, recipient)
+            );
+            CREATE TABLE IF NOT EXISTS extracted_recipients (
+                hash TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                extracted TEXT NOT NULL,
+                used_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS extracted_recipients_used ON extracted_recipients (used_at);
+            CREATE TABLE IF NOT EXISTS verdicts (
+                recipient TEXT PRIMARY KEY,
+                accepted INTEGER NOT NULL,
+                reason TEXT NOT NULL,
+                checked_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS verdicts_checked ON verdicts (checked_at);
+        """)
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[tuple]:
+        """Executa um comando SQL de forma serializada entre as threads."""
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def file_hash(self, path: str) -> str:
+        """
+        Retorna o hash SHA-256 do conteúdo do arquivo.
+        
+        Se o mesmo caminho já foi registrado com tamanho e mtime idênticos,
+        o hash armazenado é reutilizado sem reler o arquivo.
+        """
+        st = os.stat(path)
+        rows = self._execute(
+            "SELECT hash FROM files WHERE path = ? AND size = ? AND mtime = ?",
+            (path, st.st_size, st.st_mtime))
+        if rows:
+            return rows[0][0]
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def status(self, file_hash: str) -> Optional[str]:
+        """Retorna a situação registrada para o conteúdo ('processing', 'sent', 'error')."""
+        rows = self._execute("SELECT status FROM files WHERE hash = ?", (file_hash,))
+        return rows[0][0] if rows else None
+
+    def begin(self, file_hash: str, path: str) -> None:
+        """Registra o início do processamento de um arquivo."""
+        st = os.stat(path)
+        self._execute(
+            "INSERT INTO files (hash, path, size, mtime, status, updated_at) "
+            "VALUES (?, ?, ?, ?, 'processing', ?) "
+            "ON CONFLICT (hash) DO UPDATE SET path = excluded.path, size = excluded.size, "
+            "mtime = excluded.mtime, status = 'processing', updated_at = excluded.updated_at",
+            (file_hash, path, st.st_size, st.st_mtime, time.time()))
+
+    def finish(self, file_hash: str, status: str) -> None:
+        """Registra a situação final do processamento de um arquivo."""
+        self._execute("UPDATE files SET status = ?, updated_at = ? WHERE hash = ?",
+                      (status, time.time(), file_hash))
+
+    def delivered(self, file_hash: str) -> set:
+        """Retorna os destinatários que já receberam o arquivo."""
+        rows = self._execute("SELECT recipient FROM deliveries WHERE hash = ?", (file_hash,))
+        return {row[0] for row in rows}
+
+    def record_delivery(self, file_hash: str, recipient: str) -> None:
+        """Registra que o arquivo foi entregue ao destinatário."""
+        self._execute("INSERT OR IGNORE INTO deliveries (hash, recipient, sent_at) VALUES (?, ?, ?)",
+                      (file_hash, recipient, time.time()))
+
+    def retry_states(self, file_hash: str) -> Dict[str, Tuple[str, int, float]]:
+        """Retorna destinatário -> (situação, tentativas, próxima tentativa) das falhas do arquivo."""
+        rows = self._execute(
+            "SELECT recipient, status, attempts, next_attempt FROM retries WHERE hash = ?", (file_hash,))
+        return {row[0]: (row[1], row[2], row[3]) for row in rows}
+
+    def record_failure(self, file_hash: str, recipient: str, path: str, status: str,
+                       attempts: int, next_attempt: float, error: str) -> None:
+        """Registra uma falha de envio: 'pending' (nova tentativa agendada) ou 'failed' (definitiva)."""
+        self._execute(
+            "INSERT OR REPLACE INTO retries "
+            "(hash, recipient, path, status, attempts, next_attempt, last_error) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (file_hash, recipient, path, status, attempts, next_attempt, error))
+
+    def clear_failure(self, file_hash: str, recipient: str) -> None:
+        """Remove o registro de falha após uma entrega bem-sucedida."""
+        self._execute("DELETE FROM retries WHERE hash = ? AND recipient = ?", (file_hash, recipient))
+
+    def reset_failures(self, file_hash: str) -> None:
+        """Esquece as falhas do arquivo (ex.: quando ele é reenviado manualmente)."""
+        self._execute("DELETE FROM retries WHERE hash = ?", (file_hash,))
+
+    def cached_recipients(self, file_hash: str, fingerprint: str) -> Optional[List[str]]:
+        """
+        Retorna os endereços extraídos guardados para o conteúdo.
+        
+        Entradas gravadas com outra configuração de extração (fingerprint
+        diferente) são descartadas e tratadas como ausentes.
+        """
+        rows = self._execute(
+            "SELECT fingerprint, extracted FROM extracted_recipients WHERE hash = ?", (file_hash,))
+        if not rows:
+            return None
+        if rows[0][0] != fingerprint:
+            self._execute("DELETE FROM extracted_recipients WHERE hash = ?", (file_hash,))
+            return None
+        self._execute("UPDATE extracted_recipients SET used_at = ? WHERE hash = ?",
+                      (time.time(), file_hash))
+        return json.loads(rows[0][1])
+
+    def store_recipients(self, file_hash: str, fingerprint: str, extracted: List[str],
+                         max_entries: int) -> None:
+        """Guarda os endereços extraídos do conteúdo, removendo os menos usados acima de max_entries."""
+        self._execute(
+            "INSERT OR REPLACE INTO extracted_recipients (hash, fingerprint, extracted, used_at) "
+            "VALUES (?, ?, ?, ?)", (file_hash, fingerprint, json.dumps(extracted), time.time()))
+        self._execute(
+            "DELETE FROM extracted_recipients WHERE hash NOT IN "
+            "(SELECT hash FROM extracted_recipients ORDER BY used_at DESC LIMIT ?)", (max_entries,))
+
+    def recipient_verdict(self, recipient: str, accepted_ttl: float,
+                          rejected_ttl: float) -> Optional[Tuple[bool, str]]:
+        """Retorna (aceito, motivo) da verificação prévia do destinatário, se ainda válida."""
+        rows = self._execute("SELECT accepted, reason, checked_at FROM verdicts WHERE recipient = ?",
+                             (recipient.lower(),))
+        if not rows:
+            return None
+        accepted, reason, checked_at = rows[0]
+        if time.time() - checked_at >= (accepted_ttl if accepted else rejected_ttl):
+            return None
+        return bool(accepted), reason
+
+    def store_verdict(self, recipient: str, accepted: bool, reason: str, max_ttl: float) -> None:
+        """Registra o resultado da verificação prévia e descarta os vencidos há mais de max_ttl."""
+        now = time.time()
+        self._execute("INSERT OR REPLACE INTO verdicts (recipient, accepted, reason, checked_at) "
+                      "VALUES (?, ?, ?, ?)", (recipient.lower(), int(accepted), reason, now))
+        self._execute("DELETE FROM verdicts WHERE checked_at < ?", (now - max_ttl,))
+
+    def pending_retries(self) -> List[Tuple[str, float]]:
+        """Retorna (caminho, próxima tentativa) de cada arquivo com reenvios pendentes."""
+        return self._execute(
+            "SELECT path, MIN(next_attempt) FROM retries WHERE status = 'pending' GROUP BY hash, path")
+
+    def close(self) -> None:
+        """Fecha a conexão com o banco."""
+        with self._lock:
+            self._conn.close()
+
+class FileReadinessTracker:
+    """
+    Acompanha arquivos em gravação e os libera quando estiverem completos.
+    
+    Um arquivo é considerado pronto quando tamanho e data de modificação
+    permanecem estáveis durante um período de silêncio que se adapta ao
+    ritmo de escrita observado, ou imediatamente quando o escritor fecha o
+    arquivo (evento on_closed) sem alterações posteriores. Onde os eventos
+    de fechamento são confiáveis, arquivos ainda abertos só são liberados
+    após o período de silêncio máximo.
+    """
+
+    def __init__(self, on_ready: Callable[[str], None], logger: logging.Logger,
+                 quiet_period: float = 0.5, max_quiet_period: float = 10.0,
+                 max_wait: float = 600.0, poll_interval: float = 0.25,
+                 trust_close_events: bool = False, metrics: Optional[Metrics] = None):
+        """
+        Inicializa o rastreador de prontidão de arquivos.
+
+        Args:
+            on_ready: Função chamada com o caminho do arquivo quando ele estiver pronto
+            logger: Objeto de logging
+            quiet_period: Período (s) mínimo sem alterações para considerar o arquivo pronto
+            max_quiet_period: Limite (s) do período de silêncio adaptativo
+            max_wait: Tempo (s) máximo de espera por um arquivo que não estabiliza
+            poll_interval: Intervalo (s) entre verificações dos arquivos pendentes
+            trust_close_events: Indica que o observer emite on_closed para toda escrita concluída
+            metrics: Métricas onde o tempo entre detecção e prontidão é registrado
+        """
+        self.on_ready = on_ready
+        self.logger = logger
+        self.quiet_period = quiet_period
+        self.max_quiet_period = max_quiet_period
+        self.max_wait = max_wait
+        self.poll_interval = poll_interval
+        self.trust_close_events = trust_close_events
+        self.metrics = metrics or Metrics()
+
+        # caminho -> estado de observação do arquivo
+        self._files: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _stat(path: str) -> Optional[Tuple[int, float]]:
+        """Retorna (tamanho, mtime) do arquivo ou None se ele não existir mais."""
+        try:
+            st = os.stat(path)
+            return st.st_size, st.st_mtime
+        except OSError:
+            return None
+
+    def watch(self, path: str, closed: bool = False) -> None:
+        """
+        Começa (ou continua) a acompanhar um arquivo após criação ou modificação.
+        
+        Use closed=True para arquivos que já chegam completos (renomeados para
+        a pasta ou encontrados na inicialização).
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._files.get(path)
+            if state is None:
+                self._files[path] = {"size": -1, "mtime": -1.0, "changed": now,
+                                     "first_seen": now, "max_gap": 0.0,
+                                     "closed": 1.0 if closed else 0.0}
+            else:
+                state["closed"] = 1.0 if closed else 0.0
+        self._wakeup.set()
+
+    def notify_closed(self, path: str) -> None:
+        """Marca que o escritor fechou o arquivo, antecipando a verificação."""
+        with self._lock:
+            state = self._files.get(path)
+            if state is None:
+                return
+            state["closed"] = 1.0
+        self._wakeup.set()
+
+    def pending(self) -> int:
+        """Retorna o número de arquivos ainda aguardando estabilidade."""
+        with self._lock:
+            return len(self._files)
+
+    def _quiet_period_for(self, state: Dict[str, float]) -> float:
+        """Período de silêncio exigido: cresce com o maior intervalo entre escritas observado."""
+        if self.trust_close_events:
+            # Fechado pelo escritor: pronto; ainda aberto: só após o silêncio máximo
+            return 0.0 if state["closed"] else self.max_quiet_period
+        return min(self.max_quiet_period, max(self.quiet_period, 2 * state["max_gap"]))
+
+    def _check(self) -> List[str]:
+        """Atualiza o estado dos arquivos pendentes e retorna os que ficaram prontos."""
+        now = time.monotonic()
+        ready = []
+
+        with self._lock:
+            items = list(self._files.items())
+
+        for path, state in items:
+            current = self._stat(path)
+            if current is None:
+                # Arquivo removido ou renomeado antes de ficar pronto
+                with self._lock:
+                    self._files.pop(path, None)
+                continue
+
+            size, mtime = current
+            if (size, mtime) != (state["size"], state["mtime"]):
+                if state["size"] >= 0:
+                    state["max_gap"] = max(state["max_gap"], now - state["changed"])
+                state["size"], state["mtime"], state["changed"] = size, mtime, now
+                # Fechado e já com o tamanho final: não há o que esperar
+                if not (state["closed"] and size > 0):
+                    continue
+
+            stable = now - state["changed"] >= self._quiet_period_for(state)
+            if size > 0 and stable and self._can_open(path):
+                with self._lock:
+                    self._files.pop(path, None)
+                self.metrics.observe("detect_ready", now - state["first_seen"])
+                ready.append(path)
+            elif now - state["first_seen"] > self.max_wait:
+                with self._lock:
+                    self._files.pop(path, None)
+                self.logger.warning(
+                    f"Arquivo {path} não estabilizou em {self.max_wait:.0f}s; aguardando nova alteração")
+
+        return ready
+
+    @staticmethod
+    def _can_open(path: str) -> bool:
+        """Verifica se o arquivo pode ser aberto para leitura (no Windows, não está bloqueado)."""
+        try:
+            with open(path, 'rb'):
+                return True
+        except OSError:
+            return False
+
+    def _run(self) -> None:
+        """Laço de verificação executado em thread própria."""
+        while not self._stop.is_set():
+            for path in self._check():
+                self.on_ready(path)
+
+            with self._lock:
+                idle = not self._files
+            # Sem arquivos pendentes, dorme até o próximo evento
+            self._wakeup.wait(None if idle else self.poll_interval)
+            self._wakeup.clear()
+
+    def start(self) -> None:
+        """Inicia a thread de verificação."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="FileReadiness", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Encerra a thread de verificação."""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+class DirectoryScanner:
+    """
+    Observador por varredura com os.scandir, alternativo ao Observer do watchdog.
+    
+    Indicado para compartilhamentos SMB/NFS, onde os eventos do sistema de
+    arquivos não são confiáveis. Cada varredura faz apenas um stat por
+    diretório: a listagem só é refeita quando o mtime do diretório muda
+    (entrada criada, removida ou renomeada), de modo que o custo não cresce
+    com o número de arquivos. Arquivos novos são entregues ao handler como
+    on_created; a estabilidade da gravação fica a cargo do handler. O
+    intervalo entre varreduras diminui quando há atividade e cresce
+    gradualmente quando a pasta está parada. Diretórios ocultos (iniciados
+    por ".") são ignorados.
+    """
+
+    # Listagens de diretórios alterados há menos que isso são refeitas na
+    # varredura seguinte (mtime com resolução grosseira em compartilhamentos)
+    SETTLE_TIME = 2.0
+
+    def __init__(self, min_interval: float = 1.0, max_interval: float = 10.0,
+                 full_rescan_interval: float = 300.0, logger: Optional[logging.Logger] = None):
+        """
+        Inicializa o scanner.
+
+        Args:
+            min_interval: Intervalo (s) entre varreduras enquanto há atividade
+            max_interval: Intervalo (s) máximo entre varreduras com a pasta parada
+            full_rescan_interval: Intervalo (s) entre releituras completas, ignorando o cache
+            logger: Objeto de logging
+        """
+        self.logger = logger or logging.getLogger('EmailAutomation')
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.full_rescan_interval = full_rescan_interval
+        self.interval = min_interval
+
+        self._watches: List[Tuple[FileSystemEventHandler, str, bool]] = []
+        # diretório -> (mtime_ns, momento da listagem, arquivos, subdiretórios)
+        self._dirs: Dict[str, Tuple[int, float, set, List[str]]] = {}
+        self._last_full_scan = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def schedule(self, event_handler: FileSystemEventHandler, path: str,
+                 recursive: bool = False) -> None:
+        """Registra uma pasta a ser varrida (mesma assinatura do Observer)."""
+        self._watches.append((event_handler, os.path.abspath(path), recursive))
+
+    def _list(self, folder: str) -> Tuple[set, List[str]]:
+        """Lista os arquivos e subdiretórios visíveis de uma pasta."""
+        files, subdirs = set(), []
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file():
+                    files.add(entry.name)
+        return files, subdirs
+
+    def scan(self, emit: bool = True) -> int:
+        """
+        Varre as pastas registradas e retorna o número de arquivos novos.
+        
+        Com emit=False apenas preenche o cache (estado inicial).
+        """
+        now = time.time()
+        full = now - self._last_full_scan >= self.full_rescan_interval
+        if full:
+            self._last_full_scan = now
+        visited = set()
+        changes = 0
+
+        for event_handler, root, recursive in self._watches:
+            stack = [root]
+            while stack:
+                folder = stack.pop()
+                visited.add(folder)
+                try:
+                    mtime_ns = os.stat(folder).st_mtime_ns
+                    cached = self._dirs.get(folder)
+                    if (not full and cached is not None and cached[0] == mtime_ns
+                            and cached[1] - mtime_ns / 1e9 > self.SETTLE_TIME):
+                        files, subdirs = cached[2], cached[3]
+                    else:
+                        files, subdirs = self._list(folder)
+                        self._dirs[folder] = (mtime_ns, now, files, subdirs)
+                        # Pasta nova durante o monitoramento: todos os seus arquivos são novos
+                        known = cached[2] if cached is not None else (set() if folder != root else files)
+                        if emit:
+                            for name in sorted(files - known):
+                                event_handler.dispatch(FileCreatedEvent(os.path.join(folder, name)))
+                                changes += 1
+                except OSError:
+                    self._dirs.pop(folder, None)
+                    continue
+                if recursive:
+                    stack.extend(subdirs)
+
+        # Esquece diretórios removidos
+        for folder in list(self._dirs):
+            if folder not in visited:
+                del self._dirs[folder]
+        return changes
+
+    def _run(self) -> None:
+        """Laço de varredura com intervalo adaptativo."""
+        while not self._stop.wait(self.interval):
+            try:
+                changes = self.scan()
+            except Exception as e:
+                self.logger.error(f"Erro na varredura das pastas monitoradas: {str(e)}")
+                changes = 0
+            if changes:
+                self.interval = self.min_interval
+            else:
+                self.interval = min(self.max_interval, self.interval * 1.5)
+
+    def start(self) -> None:
+        """Faz a varredura inicial (sem eventos) e inicia a thread de varredura."""
+        if self._thread is not None:
+            return
+        self.scan(emit=False)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="DirectoryScanner", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Sinaliza o fim da varredura."""
+        self._stop.set()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        """Aguarda o término da thread de varredura."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+class RetryScheduler:
+    """Agenda o reprocessamento de arquivos em horários futuros sem ocupar os workers."""
+
+    # Espera (s) antes de oferecer de novo um arquivo que ainda está na fila ou em processamento
+    BUSY_DELAY = 1.0
+
+    def __init__(self, on_due: Callable[[str], bool]):
+        """
+        Inicializa o agendador.
+
+        Args:
+            on_due: Função chamada com o caminho do arquivo quando chegar a hora da nova
+                tentativa; retorna False se o arquivo não pôde ser aceito
+        """
+        self.on_due = on_due
+        self._heap: List[Tuple[float, str]] = []
+        self._scheduled: Dict[str, float] = {}
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread: Optional[threading.Thread] = None
+
+    def schedule(self, path: str, when: float) -> None:
+        """Agenda o arquivo para o instante `when` (segundos desde a época)."""
+        with self._cond:
+            # Um agendamento anterior já cobre este arquivo
+            if self._scheduled.get(path, float("inf")) <= when:
+                return
+            self._scheduled[path] = when
+            heapq.heappush(self._heap, (when, path))
+            self._cond.notify()
+
+    def pending(self) -> int:
+        """Número de reprocessamentos agendados."""
+        with self._cond:
+            return len(self._scheduled)
+
+    def _run(self) -> None:
+        """Laço que libera os arquivos cujo horário chegou."""
+        while True:
+            with self._cond:
+                while not self._stop and (not self._heap or self._heap[0][0] > time.time()):
+                    self._cond.wait(self._heap[0][0] - time.time() if self._heap else None)
+                if self._stop:
+                    return
+                when, path = heapq.heappop(self._heap)
+                # Entrada substituída por um agendamento mais próximo
+                if self._scheduled.get(path) != when:
+                    continue
+                del self._scheduled[path]
+                
+            if os.path.exists(path):
+                # O worker que agendou a tentativa pode ainda estar com o arquivo:
+                # nesse caso a tentativa é adiada em vez de descartada
+                if not self.on_due(path):
+                    self.schedule(path, time.time() + self.BUSY_DELAY)
+
+    def start(self) -> None:
+        """Inicia a thread do agendador."""
+        if self._thread is not None:
+            return
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="RetryScheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Encerra a thread do agendador (os reenvios continuam registrados no diário)."""
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+def reserve_destination(folder: str, filename: str) -> str:
+    """
+    Reserva na pasta um nome livre para o arquivo, numerando em caso de colisão.
+    
+    O nome é reservado criando um arquivo vazio com O_EXCL, de modo que
+    duas threads (ou instâncias) nunca escolham o mesmo caminho e uma
+    sobrescreva o arquivo da outra; a renomeação seguinte (os.replace)
+    substitui o arquivo vazio.
+    """
+    base, extension = os.path.splitext(filename)
+    candidate = os.path.join(folder, filename)
+    number = 1
+    while True:
+        try:
+            os.close(os.open(candidate, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+            return candidate
+        except FileExistsError:
+            candidate = os.path.join(folder, f"{base} ({number}){extension}")
+            number += 1
+
+def discard_reservation(destination: str) -> None:
+    """Remove o arquivo vazio que reservava o nome após uma falha na movimentação."""
+    try:
+        if os.path.getsize(destination) == 0:
+            os.remove(destination)
+    except OSError:
+        pass
+
+def move_into(source: str, folder: str) -> str:
+    """
+    Move o arquivo para a pasta (no mesmo volume) sem sobrescrever outro de
+    mesmo nome. Lança FileNotFoundError se a origem não existir mais.
+    """
+    os.makedirs(folder, exist_ok=True)
+    destination = reserve_destination(folder, os.path.basename(source))
+    try:
+        os.replace(source, destination)
+    except BaseException:
+        discard_reservation(destination)
+        raise
+    return destination
+
+class FileClaims:
+    """
+    Coordena várias instâncias que esvaziam a mesma pasta compartilhada.
+    
+    Cada arquivo é reivindicado por uma renomeação atômica para
+    <pasta>/.processing/<nó>/, de modo que apenas uma instância o processa.
+    Cada nó renova periodicamente um arquivo de heartbeat; os arquivos de
+    nós cujo heartbeat expirou são devolvidos à pasta monitorada para que
+    outra instância os assuma. Nomes repetidos nunca se sobrescrevem: o
+    segundo "fatura.pdf" vira "fatura (1).pdf".
+    
+    O diário de cada nó é local: ao parar, o nó mantém consigo os arquivos
+    que aguardam novas tentativas (retain) e os retoma ao reiniciar com o
+    mesmo node_id. Só um arquivo retomado de um nó que caiu, ou que ficou
+    parado além de lease_timeout, pode repetir entregas já feitas por ele.
+    """
+
+    DIRECTORY = ".processing"
+    HEARTBEAT = ".heartbeat"
+
+    def __init__(self, monitor_folder: str, logger: logging.Logger, node_id: Optional[str] = None,
+                 lease_timeout: float = 120.0, heartbeat_interval: float = 15.0,
+                 on_reclaimed: Optional[Callable[[str], None]] = None,
+                 retain: Optional[Callable[[str], bool]] = None):
+        """
+        Inicializa a coordenação entre instâncias.
+
+        Args:
+            monitor_folder: Pasta monitorada compartilhada
+            logger: Objeto de logging
+            node_id: Identificador único da instância (padrão: host-pid)
+            lease_timeout: Tempo (s) sem heartbeat após o qual os arquivos do nó são retomados
+            heartbeat_interval: Intervalo (s) entre renovações do heartbeat e buscas por nós expirados
+            on_reclaimed: Função chamada com o caminho de cada arquivo devolvido à pasta
+            retain: Indica os arquivos do próprio nó que não são devolvidos ao
+                parar ou iniciar (ex.: aguardando novas tentativas)
+        """
+        self.monitor_folder = monitor_folder
+        self.logger = logger
+        self.node_id = node_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_timeout = lease_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.on_reclaimed = on_reclaimed
+        self.retain = retain
+
+        self.root = os.path.join(monitor_folder, self.DIRECTORY)
+        self.node_folder = os.path.join(self.root, self.node_id)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def claim(self, path: str) -> Optional[str]:
+        """
+        Reivindica o arquivo para este nó.
+        
+        Retorna o novo caminho do arquivo, ou None se outra instância já o
+        reivindicou. Arquivos que já estão na pasta do nó são devolvidos como estão.
+        """
+        path = os.path.abspath(path)
+        node_folder = os.path.abspath(self.node_folder)
+        if path.startswith(node_folder + os.sep):
+            return path if os.path.exists(path) else None
+        # Preserva a subpasta de origem (modo recursivo)
+        relative = os.path.relpath(path, os.path.abspath(self.monitor_folder))
+        try:
+            return move_into(path, os.path.dirname(os.path.join(node_folder, relative)))
+        except FileNotFoundError:
+            return None
+
+    def heartbeat(self) -> None:
+        """Renova o heartbeat deste nó."""
+        os.makedirs(self.node_folder, exist_ok=True)
+        with open(os.path.join(self.node_folder, self.HEARTBEAT), 'w') as file:
+            file.write(str(time.time()))
+
+    def _release(self, node_folder: str,
+                 retain: Optional[Callable[[str], bool]] = None) -> List[str]:
+        """
+        Devolve os arquivos de uma pasta de nó à pasta monitorada e remove a pasta do nó.
+        
+        Arquivos para os quais retain retorna True ficam na pasta do nó, com o heartbeat.
+        """
+        released = []
+        retained = False
+        for folder, _, names in os.walk(node_folder, topdown=False):
+            for name in names:
+                if name == self.HEARTBEAT and folder == node_folder:
+                    continue
+                source = os.path.join(folder, name)
+                if retain is not None and retain(source):
+                    retained = True
+                    continue
+                relative = os.path.relpath(folder, node_folder)
+                try:
+                    released.append(move_into(source, os.path.normpath(
+                        os.path.join(self.monitor_folder, relative))))
+                except FileNotFoundError:
+                    continue  # Outra instância retomou primeiro
+            if folder != node_folder:
+                try:
+                    os.rmdir(folder)
+                except OSError:
+                    pass
+        if retained:
+            return released
+        try:
+            os.remove(os.path.join(node_folder, self.HEARTBEAT))
+        except FileNotFoundError:
+            pass
+        try:
+            os.rmdir(node_folder)
+        except OSError:
+            pass
+        return released
+
+    def reclaim_expired(self) -> int:
+        """Devolve à pasta monitorada os arquivos de nós cujo heartbeat expirou."""
+        reclaimed = 0
+        try:
+            nodes = [entry for entry in os.scandir(self.root)
+                     if entry.is_dir() and entry.name != self.node_id]
+        except FileNotFoundError:
+            return 0
+
+        now = time.time()
+        for node in nodes:
+            try:
+                last_beat = os.stat(os.path.join(node.path, self.HEARTBEAT)).st_mtime
+            except FileNotFoundError:
+                last_beat = node.stat().st_mtime
+            if now - last_beat < self.lease_timeout:
+                continue
+
+            for destination in self._release(node.path):
+                reclaimed += 1
+                self.logger.warning(f"Arquivo {destination} retomado do nó inativo {node.name}")
+                if self.on_reclaimed is not None:
+                    self.on_reclaimed(destination)
+        return reclaimed
+
+    def _run(self) -> None:
+        """Laço de heartbeat e retomada executado em thread própria."""
+        while not self._stop.is_set():
+            try:
+                self.heartbeat()
+                self.reclaim_expired()
+            except OSError as e:
+                self.logger.error(f"Erro na coordenação entre instâncias: {str(e)}")
+            self._stop.wait(self.heartbeat_interval)
+
+    def start(self) -> None:
+        """
+        Registra o nó e inicia o heartbeat.
+        
+        Arquivos deixados por uma execução anterior deste nó voltam à pasta,
+        exceto os mantidos por retain, que seguem com o nó.
+        """
+        if self._thread is not None:
+            return
+        for destination in self._release(self.node_folder, self.retain):
+            self.logger.info(f"Arquivo {destination} devolvido à pasta (execução anterior deste nó)")
+            if self.on_reclaimed is not None:
+                self.on_reclaimed(destination)
+        self.heartbeat()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="FileClaims", daemon=True)
+        self._thread.start()
 
-# Configuração do tema
-ctk.set_appearance_mode("System")
-ctk.set_default_color_theme("blue")
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Encerra o heartbeat e devolve à pasta monitorada os arquivos ainda
+        reivindicados, exceto os mantidos por retain.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        try:
+            self._release(self.node_folder, self.retain)
+        except OSError as e:
+            self.logger.error(f"Erro ao devolver arquivos reivindicados: {str(e)}")
 
-class LogHandler(logging.Handler):
-    """Handler personalizado para exibir logs na interface gráfica."""
+def is_transient_smtp_error(error: Exception) -> bool:
+    """
+    Classifica uma falha de envio: respostas 4xx e falhas de rede são
+    transitórias (vale tentar de novo); respostas 5xx e demais erros são definitivos.
+    """
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPSenderRefused):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, (smtplib.SMTPServerDisconnected, OSError, asyncio.TimeoutError))
+
+class AddressExtractor:
+    """
+    Extrai, normaliza e deduplica endereços de email em uma única passada.
     
-    def __init__(self, text_widget: ctk.CTkTextbox):
-        super().__init__()
-        self.text_widget = text_widget
+    Em vez de tentar o padrão em cada posição do texto, a busca salta de
+    "@" em "@" (str.find) e analisa apenas a vizinhança de cada um com
+    padrões pré-compilados, que toleram quebras de linha junto ao "@" e
+    após os pontos do domínio, comuns no texto extraído de PDFs
+    ("joao@\nempresa.com", "joao@empresa.\ncom.br"). Cada endereço tem o domínio convertido para
+    minúsculas e a pontuação final removida; a parte local nunca é alterada.
+    Uma parte local que começa no meio de uma palavra (letra, inclusive
+    acentuada, ou palavra partida por quebra de linha) é descartada em vez de
+    cortada, pois o trecho restante seria o endereço de outra pessoa.
+    Repetições (sem diferenciar maiúsculas) são descartadas mantendo a
+    primeira ocorrência.
+    """
 
-    def emit(self, record: logging.LogRecord) -> None:
-        """Adiciona a mensagem de log ao widget de texto."""
-        msg = self.format(record)
+    # Incrementar quando a normalização mudar: invalida os destinatários em cache
+    VERSION = 3
+
+    _BREAK = r'(?:[ \t]*\r?\n[ \t]*)?'
+    LOCAL_PATTERN = rf'[a-zA-Z0-9._%+-]+{_BREAK}\Z'
+    DOMAIN_PATTERN = rf'{_BREAK}[a-zA-Z0-9-]+(?:\.{_BREAK}[a-zA-Z0-9-]+)*\.{_BREAK}[a-zA-Z]{{2,}}'
+    PATTERN = LOCAL_PATTERN[:-2] + '@' + DOMAIN_PATTERN
+
+    # Tamanho máximo da parte local (RFC 5321), mais folga para uma quebra de linha
+    MAX_LOCAL = 64 + 16
+    LOCAL_CHARS = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789._%+-")
+
+    def __init__(self):
+        self._local = re.compile(self.LOCAL_PATTERN)
+        self._domain_part = re.compile(self.DOMAIN_PATTERN)
+        self._line_break = re.compile(r'[ \t]*\r?\n[ \t]*')
+        self._break_before = re.compile(r'[ \t]*\r?\n[ \t]*\Z')
+        self._valid = re.compile(EMAIL_PATTERN)
+        self._domain = re.compile(r'[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+
+    def normalize(self, raw: str) -> Optional[str]:
+        """Normaliza um endereço encontrado no texto; retorna None se ele não for válido."""
+        local, _, domain = raw.partition('@')
+        local = self._line_break.sub('', local)
+        if local.startswith('.') or local.endswith('.'):
+            return None
         
-        def append():
-            self.text_widget.configure(state="normal")
-            self.text_widget.insert("end", msg + "\n")
-            self.text_widget.configure(state="disabled")
-            self.text_widget.see("end")
+        # Quebra após um domínio já completo é fim de frase ("empresa.com.\nObrigado")
+        parts = self._line_break.split(domain)
+        domain = parts[0]
+        for part in parts[1:]:
+            if self._domain.fullmatch(domain.rstrip('.')):
+                break
+            domain += part
+        
+        address = f"{local}@{domain.rstrip('.-').lower()}"
+        return address if self._valid.fullmatch(address) else None
+
+    def _starts_inside_word(self, text: str, start: int) -> bool:
+        """Indica se a parte local em `start` continua uma palavra anterior, na mesma linha ou na linha de cima."""
+        if start == 0:
+            return False
+        previous = text[start - 1]
+        if previous.isalnum() or previous in self.LOCAL_CHARS:
+            return True
+        line_break = self._break_before.search(text, max(0, start - self.MAX_LOCAL), start)
+        if line_break is None or line_break.start() == 0:
+            return False
+        previous = text[line_break.start() - 1]
+        return previous.isalnum() or previous in self.LOCAL_CHARS
+
+    def extract(self, text: str, seen: Optional[Dict[str, str]] = None) -> List[str]:
+        """
+        Retorna os endereços novos do texto, na ordem em que aparecem.
+        
+        Args:
+            text: Texto a analisar
+            seen: Endereços já encontrados (chave em minúsculas), atualizado no lugar;
+                permite deduplicar entre as páginas de um documento
+        """
+        seen = {} if seen is None else seen
+        found = []
+        position = text.find('@')
+        while position != -1:
+            window = max(0, position - self.MAX_LOCAL)
+            local = self._local.search(text, window, position)
+            # Parte local cortada (pela janela, por um acento ou por uma quebra
+            # de linha) daria o endereço de outra pessoa
+            if local is not None and self._starts_inside_word(text, local.start()):
+                local = None
+            domain = self._domain_part.match(text, position + 1)
+            if local is None or domain is None:
+                position = text.find('@', position + 1)
+                continue
+            
+            address = self.normalize(text[local.start():domain.end()])
+            if address is not None:
+                key = address.lower()
+                if key not in seen:
+                    seen[key] = address
+                    found.append(address)
+            position = text.find('@', domain.end())
+        return found
+
+    def is_valid(self, address: str) -> bool:
+        """Verifica a sintaxe de um endereço completo."""
+        return self._valid.fullmatch(address) is not None
+
+# Instância compartilhada (também usada nos processos de extração)
+ADDRESS_EXTRACTOR = AddressExtractor()
+
+def scan_pdf_for_emails(pdf_path: str, max_pages: Optional[int] = None,
+                        stop_on_first_match: bool = False) -> List[str]:
+    """
+    Extrai os endereços de email de um PDF página a página.
+    
+    Cada página é analisada assim que seu texto é extraído, sem acumular o
+    texto do documento inteiro; os endereços são normalizados e
+    deduplicados no documento todo. Definida no nível do módulo para poder
+    ser executada em um processo separado.
+    
+    Args:
+        pdf_path: Caminho do arquivo PDF
+        max_pages: Número máximo de páginas lidas (None lê todas)
+        stop_on_first_match: Interrompe a leitura na primeira página com emails
+    """
+    found_emails: List[str] = []
+    seen: Dict[str, str] = {}
+    
+    with open(pdf_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        
+        for number, page in enumerate(reader.pages, start=1):
+            if max_pages is not None and number > max_pages:
+                break
+                
+            page_emails = ADDRESS_EXTRACTOR.extract(page.extract_text() or "", seen)
+            found_emails.extend(page_emails)
             
-        self.text_widget.after(0, append)
+            if stop_on_first_match and page_emails:
+                break
+                
+    return found_emails
+
+class FolderRoute:
+    """
+    Pasta de entrada com templates, pastas de destino e peso próprios.
+    
+    Várias rotas são atendidas pelo mesmo PDFHandler; o peso define a fatia
+    dos workers que cada rota recebe quando todas têm arquivos na fila.
+    """
+
+    def __init__(self, name: str, monitor_folder: str, sent_folder: str, error_folder: str,
+                 email_template: str, error_template: str, weight: float = 1.0,
+                 recipient_batching: Optional[str] = None, queue_size: int = 100):
+        """
+        Inicializa a rota.
+
+        Args:
+            name: Nome da rota (usado em logs e métricas)
+            monitor_folder: Pasta monitorada pela rota
+            sent_folder: Pasta para arquivos enviados com sucesso
+            error_folder: Pasta para arquivos com erro
+            email_template: Template para emails normais
+            error_template: Template para emails de erro
+            weight: Peso no escalonamento justo (ex.: 4 recebe quatro vezes a vazão de 1)
+            recipient_batching: Modo de agrupamento de destinatários da rota (None usa o do handler)
+            queue_size: Capacidade da fila da rota
+        """
+        if weight <= 0:
+            raise ValueError(f"Peso da rota {name} deve ser positivo")
+        self.name = name
+        self.monitor_folder = monitor_folder
+        self.sent_folder = sent_folder
+        self.error_folder = error_folder
+        self.email_template = email_template
+        self.error_template = error_template
+        self.weight = weight
+        self.recipient_batching = recipient_batching
+        self.queue_size = max(1, queue_size)
+        self.claims: Optional["FileClaims"] = None
+
+    def contains(self, path: str) -> bool:
+        """Indica se o caminho está dentro da pasta monitorada da rota."""
+        folder = os.path.abspath(self.monitor_folder)
+        return (os.path.abspath(path) + os.sep).startswith(folder + os.sep)
+
+class FairQueue:
+    """
+    Fila de trabalho com enfileiramento justo ponderado (WFQ) entre rotas.
+    
+    Cada item recebe uma etiqueta de término virtual que avança 1/peso a
+    cada item da rota; os workers retiram sempre a menor etiqueta entre as
+    cabeças das filas. Assim uma rota com muitos arquivos não impede as
+    demais de receberem sua fatia, e uma rota ociosa não acumula crédito.
+    Cada rota tem capacidade própria; o que não cabe aguarda na reserva da
+    rota, em ordem de chegada, e entra na fila quando um item dela é
+    retirado. Oferece get/get_nowait/task_done/qsize como queue.Queue.
+    """
+
+    def __init__(self):
+        self._queues: Dict[str, deque] = {}
+        self._overflow: Dict[str, deque] = {}
+        self._weights: Dict[str, float] = {}
+        self._capacity: Dict[str, int] = {}
+        self._finish: Dict[str, float] = {}
+        self._virtual_time = 0.0
+        self._control: deque = deque()
+        self._cond = threading.Condition()
+
+    def add_route(self, name: str, weight: float = 1.0, maxsize: int = 100) -> None:
+        """Registra uma rota com seu peso e capacidade."""
+        with self._cond:
+            self._queues[name] = deque()
+            self._overflow[name] = deque()
+            self._weights[name] = weight
+            self._capacity[name] = max(1, maxsize)
+            self._finish[name] = 0.0
+
+    def put(self, item: str, route: str, block: bool = True) -> None:
+        """
+        Coloca um item na fila da rota.
+        
+        Com a fila da rota cheia, block=True aguarda espaço e block=False
+        guarda o item na reserva da rota.
+        """
+        with self._cond:
+            while len(self._queues[route]) >= self._capacity[route] or self._overflow[route]:
+                if not block:
+                    self._overflow[route].append(item)
+                    return
+                self._cond.wait()
+            self._append(item, route)
+            self._cond.notify_all()
+
+    def _append(self, item: str, route: str) -> None:
+        """Etiqueta o item e o coloca no fim da fila da rota (com o lock adquirido)."""
+        tag = max(self._virtual_time, self._finish[route]) + 1.0 / self._weights[route]
+        self._finish[route] = tag
+        self._queues[route].append((tag, item))
+
+    def put_control(self, item: Optional[str]) -> None:
+        """Coloca um item de controle (ex.: sinal de parada) à frente de todas as rotas."""
+        with self._cond:
+            self._control.append(item)
+            self._cond.notify_all()
+
+    def get(self, block: bool = True) -> Optional[str]:
+        """Retira o próximo item; com block=False lança queue.Empty se não houver itens."""
+        with self._cond:
+            while True:
+                if self._control:
+                    return self._control.popleft()
+                heads = [(entries[0][0], name) for name, entries in self._queues.items() if entries]
+                if heads:
+                    _, name = min(heads)
+                    tag, item = self._queues[name].popleft()
+                    self._virtual_time = tag
+                    # A vaga liberada vai primeiro para a reserva da rota
+                    if self._overflow[name]:
+                        self._append(self._overflow[name].popleft(), name)
+                    # Libera quem aguarda espaço na fila da rota
+                    self._cond.notify_all()
+                    return item
+                if not block:
+                    raise queue.Empty
+                self._cond.wait()
+
+    def get_nowait(self) -> Optional[str]:
+        """Equivalente a get(block=False)."""
+        return self.get(block=False)
+
+    def task_done(self) -> None:
+        """Compatibilidade com queue.Queue (a fila não acompanha itens concluídos)."""
+
+    def qsize(self, route: Optional[str] = None) -> int:
+        """Itens aguardando (incluindo a reserva), no total ou de uma rota."""
+        with self._cond:
+            if route is not None:
+                return len(self._queues[route]) + len(self._overflow[route])
+            return sum(len(entries) + len(self._overflow[name])
+                       for name, entries in self._queues.items())
 
 class PDFHandler(FileSystemEventHandler):
     """Classe responsável por monitorar e processar arquivos PDF."""
@@ -46,7 +2408,31 @@ class PDFHandler(FileSystemEventHandler):
                  monitor_folder: str, sent_folder: str, error_folder: str, 
                  email_template: str, error_template: str, 
                  update_stats_callback: Callable[[int, int, int], None], 
-                 logger: logging.Logger):
+                 logger: logging.Logger, smtp_pool_size: int = 3,
+                 smtp_idle_timeout: float = 60.0, workers: int = 4,
+                 queue_size: int = 100, mx_cache: Optional[MXCache] = None,
+                 dns_concurrency: int = 8, extraction_processes: int = 2,
+                 max_pages: Optional[int] = None, stop_on_first_match: bool = False,
+                 ready_quiet_period: float = 0.5, ready_max_wait: float = 600.0,
+                 ready_trust_close_events: Optional[bool] = None,
+                 journal_path: str = ":memory:", smtp_engine: str = "sync",
+                 smtp_use_tls: bool = True, rate_limit: float = 0.0,
+                 domain_rate_limit: float = 0.0, max_concurrent_sends: int = 0,
+                 retry_max_attempts: int = 5, retry_base_delay: float = 60.0,
+                 retry_max_delay: float = 3600.0, metrics_port: int = 0,
+                 metrics_json_path: Optional[str] = None, metrics_json_interval: float = 60.0,
+                 recipient_cache_size: int = 10000,
+                 claim_files: bool = False, node_id: Optional[str] = None,
+                 lease_timeout: float = 120.0, heartbeat_interval: float = 15.0,
+                 observer_mode: str = "native", recursive: bool = False,
+                 poll_interval: float = 1.0, poll_max_interval: float = 10.0,
+                 recipient_batching: str = "off",
+                 folder_batching: Optional[Dict[str, str]] = None,
+                 routes: Optional[List[Dict[str, object]]] = None,
+                 preflight_verification: bool = False, verdict_ttl: float = 86400.0,
+                 rejected_verdict_ttl: float = 604800.0, tracing: bool = False,
+                 trace_path: Optional[str] = None, profiling: bool = False,
+                 profile_interval: float = 0.005):
         """
         Inicializa o handler de PDF com as configurações necessárias.
         
@@ -62,6 +2448,61 @@ class PDFHandler(FileSystemEventHandler):
             error_template: Template para emails de erro
             update_stats_callback: Função para atualizar estatísticas
             logger: Objeto de logging
+            smtp_pool_size: Número máximo de conexões SMTP mantidas abertas
+            smtp_idle_timeout: Tempo (s) máximo de ociosidade de uma conexão SMTP
+            workers: Número de threads que processam os PDFs em paralelo
+            queue_size: Capacidade máxima da fila de arquivos aguardando processamento
+            mx_cache: Cache de consultas MX (um cache apenas em memória é criado se omitido)
+            dns_concurrency: Número máximo de consultas DNS simultâneas
+            extraction_processes: Processos dedicados à extração de texto (0 extrai na própria thread)
+            max_pages: Limite de páginas lidas por PDF (None lê todas)
+            stop_on_first_match: Para a leitura na primeira página que contiver emails
+            ready_quiet_period: Período (s) mínimo sem escrita antes de processar um arquivo
+            ready_max_wait: Tempo (s) máximo de espera por um arquivo ainda em gravação
+            ready_trust_close_events: Aguarda o evento on_closed antes de processar
+                (None ativa automaticamente no Linux, onde o inotify o emite)
+            journal_path: Banco SQLite do diário de processamento (":memory:" não persiste)
+            smtp_engine: Motor de envio: "sync" (smtplib) ou "async" (asyncio com PIPELINING)
+            smtp_use_tls: Usa STARTTLS nas conexões SMTP (desative apenas em relays locais)
+            rate_limit: Mensagens por segundo enviadas ao relay no total (0 = sem limite)
+            domain_rate_limit: Mensagens por segundo por domínio de destino (0 = sem limite)
+            max_concurrent_sends: Envios SMTP simultâneos permitidos (0 = sem limite)
+            retry_max_attempts: Tentativas de envio por destinatário antes da falha definitiva
+            retry_base_delay: Espera (s) antes da primeira nova tentativa, dobrada a cada falha
+            retry_max_delay: Espera (s) máxima entre tentativas
+            metrics_port: Porta local do endpoint Prometheus /metrics (0 desativa)
+            metrics_json_path: Arquivo para snapshots JSON periódicos das métricas (None desativa)
+            metrics_json_interval: Intervalo (s) entre snapshots JSON
+            recipient_cache_size: Documentos com endereços extraídos guardados no diário (0 desativa)
+            claim_files: Reivindica cada arquivo antes de processá-lo, permitindo várias
+                instâncias sobre a mesma pasta compartilhada
+            node_id: Identificador desta instância (padrão: host e diário; host-pid com
+                o diário em memória). Com o mesmo node_id, um reinício retoma os arquivos
+                que aguardavam novas tentativas
+            lease_timeout: Tempo (s) sem heartbeat após o qual os arquivos de uma instância são retomados
+            heartbeat_interval: Intervalo (s) entre heartbeats desta instância
+            observer_mode: Detecção de arquivos: "native" (eventos do sistema, via watchdog)
+                ou "polling" (varredura com os.scandir, para compartilhamentos de rede)
+            recursive: Monitora também as subpastas; os arquivos vão para a subpasta de
+                mesmo nome em enviados/erros
+            poll_interval: Intervalo (s) mínimo entre varreduras no modo "polling"
+            poll_max_interval: Intervalo (s) máximo entre varreduras com a pasta parada
+            recipient_batching: Envio aos vários destinatários de um PDF: "off" (uma mensagem
+                por destinatário), "to" (uma mensagem com todos em To) ou "bcc" (uma
+                mensagem com os destinatários apenas no envelope)
+            folder_batching: Modo de envio por subpasta (caminho relativo à pasta monitorada),
+                sobrepondo recipient_batching
+            routes: Pastas de entrada adicionais, cada uma com os argumentos de FolderRoute
+                (monitor_folder obrigatório; as demais chaves herdam os valores do handler).
+                A pasta monitorada principal forma a rota "principal", de peso 1.
+            preflight_verification: Verifica os destinatários com RCPT TO antes de montar
+                o anexo; os recusados (5xx) são marcados como falha sem envio
+            verdict_ttl: Validade (s) de um destinatário aceito na verificação prévia
+            rejected_verdict_ttl: Validade (s) de um destinatário recusado na verificação prévia
+            tracing: Inicia com o rastreamento das etapas ativado (alternável em execução)
+            trace_path: Arquivo JSON Lines dos spans (padrão: trace.jsonl na pasta da aplicação)
+            profiling: Amostra as pilhas das etapas enquanto o rastreamento estiver ativo
+            profile_interval: Intervalo (s) entre amostras do perfil
         """
         self.smtp_server = smtp_server
         self.smtp_port = smtp_port
@@ -75,10 +2516,148 @@ class PDFHandler(FileSystemEventHandler):
         self.update_stats = update_stats_callback
         self.logger = logger
         
+        # Métricas de latência por etapa e medidores do pipeline
+        self.metrics = Metrics()
+        self.metrics_exporter = MetricsExporter(
+            self.metrics, logger, port=metrics_port, json_path=metrics_json_path,
+            json_interval=metrics_json_interval)
+        
+        # Rastreamento por arquivo e perfil das etapas, ativados sob demanda
+        self.tracing = tracing
+        self.profiling = profiling
+        self.tracer = PipelineTracer(
+            logger, trace_path or os.path.join(APP_DATA_DIR, "trace.jsonl"),
+            profile_interval=profile_interval)
+        self.metrics.tracer = self.tracer
+        
         # Configuração do resolvedor DNS
         self.resolver = dns.resolver.Resolver()
         self.resolver.timeout = 5
         self.resolver.lifetime = 5
+        self.mx_cache = mx_cache if mx_cache is not None else MXCache()
+        
+        # Consultas MX concorrentes; consultas repetidas ao mesmo domínio são agrupadas
+        self.dns_executor = ThreadPoolExecutor(max_workers=max(1, dns_concurrency),
+                                               thread_name_prefix="DNSLookup")
+        self._dns_inflight: Dict[str, Future] = {}
+        self._dns_lock = threading.Lock()
+        
+        # Extração de texto fora do GIL das threads de processamento
+        self.max_pages = max_pages
+        self.stop_on_first_match = stop_on_first_match
+        self.extraction_executor = (ProcessPoolExecutor(max_workers=extraction_processes)
+                                    if extraction_processes > 0 else None)
+        
+        # Pool de conexões SMTP reutilizadas entre envios
+        self.smtp_pool = SMTPConnectionPool(
+            smtp_server, smtp_port, email, password,
+            size=smtp_pool_size, idle_timeout=smtp_idle_timeout, use_tls=smtp_use_tls,
+            metrics=self.metrics)
+        
+        # Motor de entrega: o próprio pool (síncrono) ou o motor assíncrono, com o mesmo contrato
+        if smtp_engine == "async":
+            self.transport = AsyncSMTPDelivery(
+                smtp_server, smtp_port, email, password, sessions=smtp_pool_size,
+                idle_timeout=smtp_idle_timeout, use_tls=smtp_use_tls, logger=logger,
+                metrics=self.metrics)
+        elif smtp_engine == "sync":
+            self.transport = self.smtp_pool
+        else:
+            raise ValueError(f"Motor SMTP desconhecido: {smtp_engine}")
+        
+        # Ritmo de envio dentro dos limites do provedor
+        self.scheduler = SendScheduler(rate_limit, domain_rate_limit, max_concurrent_sends)
+        
+        # Fila limitada entre a detecção (observer) e o processamento (workers)
+        self.workers = max(1, workers)
+        self.work_queue = FairQueue()
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._worker_threads: List[threading.Thread] = []
+        
+        # Detecção de novos arquivos
+        if observer_mode not in ("native", "polling"):
+            raise ValueError(f"Modo de observação desconhecido: {observer_mode}")
+        self.observer_mode = observer_mode
+        self.recursive = recursive
+        self.poll_interval = poll_interval
+        self.poll_max_interval = poll_max_interval
+        
+        # Rotas: cada pasta de entrada tem sua fila, atendida por peso
+        defaults = {"sent_folder": sent_folder, "error_folder": error_folder,
+                    "email_template": email_template, "error_template": error_template,
+                    "queue_size": queue_size}
+        self.routes = [FolderRoute("principal", monitor_folder, **defaults)]
+        for number, options in enumerate(routes or [], start=1):
+            options = {"name": f"rota{number}", **defaults, **options}
+            self.routes.append(FolderRoute(**options))
+        if len({route.name for route in self.routes}) != len(self.routes):
+            raise ValueError("Nomes de rotas repetidos")
+        for route in self.routes:
+            self.work_queue.add_route(route.name, route.weight, route.queue_size)
+        
+        # Libera para a fila apenas arquivos completamente gravados
+        # (a varredura não vê fechamentos: vale apenas o período de silêncio)
+        if ready_trust_close_events is None:
+            ready_trust_close_events = sys.platform.startswith("linux") and observer_mode == "native"
+        self.readiness = FileReadinessTracker(
+            lambda path: self.enqueue(path, block=False), logger, quiet_period=ready_quiet_period, max_wait=ready_max_wait,
+            trust_close_events=ready_trust_close_events, metrics=self.metrics)
+        
+        # Diário de processamento: evita reenvios após quedas ou arquivos repetidos
+        self.journal = ProcessingJournal(journal_path)
+        
+        # Verificação prévia dos destinatários, com resultados guardados no diário
+        self.preflight_verification = preflight_verification
+        self.verdict_ttl = verdict_ttl
+        self.rejected_verdict_ttl = rejected_verdict_ttl
+        
+        # Endereços extraídos por conteúdo: documentos repetidos não são relidos.
+        # A impressão digital invalida o cache quando a extração muda.
+        self.recipient_cache_size = recipient_cache_size
+        self.extraction_fingerprint = hashlib.sha256(
+            json.dumps([AddressExtractor.PATTERN, AddressExtractor.VERSION,
+                        max_pages, stop_on_first_match]).encode()).hexdigest()[:16]
+        
+        # Novas tentativas de envio com backoff exponencial, registradas no diário
+        self.retry_max_attempts = max(1, retry_max_attempts)
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.retries = RetryScheduler(lambda path: self.enqueue(path, block=False))
+        
+        # Envio agrupado: o anexo é transmitido uma única vez para todos os destinatários
+        self.folder_batching = {os.path.normpath(folder): mode
+                                for folder, mode in (folder_batching or {}).items()}
+        self.recipient_batching = recipient_batching
+        for mode in [recipient_batching, *self.folder_batching.values(),
+                     *(route.recipient_batching for route in self.routes if route.recipient_batching)]:
+            if mode not in ("off", "to", "bcc"):
+                raise ValueError(f"Modo de agrupamento de destinatários desconhecido: {mode}")
+        
+        # Reivindicação de arquivos entre instâncias que compartilham as pastas
+        if claim_files:
+            if node_id is None and journal_path != ":memory:":
+                # Estável entre reinícios: o nó é identificado pelo diário que guarda suas entregas
+                node_id = f"{socket.gethostname()}-" + hashlib.sha256(
+                    os.path.abspath(journal_path).encode()).hexdigest()[:8]
+            for route in self.routes:
+                route.claims = FileClaims(
+                    route.monitor_folder, logger, node_id=node_id, lease_timeout=lease_timeout,
+                    heartbeat_interval=heartbeat_interval,
+                    on_reclaimed=lambda path: self.readiness.watch(path, closed=True),
+                    retain=self.is_retrying)
+        
+        # Medidores lidos sob demanda pelo exportador de métricas
+        self._in_flight = 0
+        self.metrics.gauge("queue_depth", self.work_queue.qsize)
+        self.metrics.gauge("files_in_flight", lambda: self._in_flight)
+        self.metrics.gauge("files_waiting_ready", self.readiness.pending)
+        self.metrics.gauge("retries_scheduled", self.retries.pending)
+        self.metrics.gauge("sends_waiting_rate_limit", self.scheduler.queued)
+        self.metrics.gauge("dns_lookups_in_flight", lambda: len(self._dns_inflight))
+        self.metrics.gauge("mx_cache_hits", lambda: self.mx_cache.stats()["hits"])
+        self.metrics.gauge("mx_cache_misses", lambda: self.mx_cache.stats()["misses"])
+        self.metrics.gauge("mx_cache_hit_ratio", lambda: self.mx_cache.stats()["hit_rate"])
         
         # Estatísticas
         self.processed_files = 0
@@ -88,144 +2667,692 @@ class PDFHandler(FileSystemEventHandler):
     def validate_email(self, email: str) -> bool:
         """Valida um endereço de email verificando sintaxe e registros MX."""
         # Verificação básica de sintaxe
-        if not re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', email):
+        if not ADDRESS_EXTRACTOR.is_valid(email):
             return False
             
-        domain = email.split('@')[-1]
+        domain = email.split('@')[-1].lower()
+        return self._lookup_domain(domain).result()
+
+    def validate_emails(self, emails: List[str]) -> List[str]:
+        """Valida uma lista de emails resolvendo os domínios distintos em paralelo."""
+        candidates = [email for email in dict.fromkeys(emails) if ADDRESS_EXTRACTOR.is_valid(email)]
+        
+        lookups = {}
+        for email in candidates:
+            domain = email.split('@')[-1].lower()
+            if domain not in lookups:
+                lookups[domain] = self._lookup_domain(domain)
+        
+        return [email for email in candidates
+                if lookups[email.split('@')[-1].lower()].result()]
+
+    def _lookup_domain(self, domain: str) -> Future:
+        """
+        Retorna um Future com o resultado da verificação MX do domínio.
         
+        Respostas em cache são devolvidas imediatamente; se já houver uma
+        consulta em andamento para o domínio, o mesmo Future é compartilhado.
+        """
+        cached = self.mx_cache.get(domain)
+        if cached is not None:
+            valid, reason = cached
+            if not valid:
+                self.logger.warning(f"{reason} (cache)")
+            future: Future = Future()
+            future.set_result(valid)
+            return future
+        
+        with self._dns_lock:
+            future = self._dns_inflight.get(domain)
+            if future is not None:
+                return future
+            future = self.dns_executor.submit(self.tracer.run_as, "dns_validation",
+                                              self._resolve_domain, domain)
+            self._dns_inflight[domain] = future
+        # Fora do lock: se a consulta já terminou, o callback roda nesta thread
+        # e precisa adquirir o lock para remover o domínio
+        future.add_done_callback(lambda _, d=domain: self._dns_done(d))
+        return future
+
+    def _dns_done(self, domain: str) -> None:
+        """Remove o domínio da lista de consultas em andamento."""
+        with self._dns_lock:
+            self._dns_inflight.pop(domain, None)
+
+    def _resolve_domain(self, domain: str) -> bool:
+        """Consulta os registros MX de um domínio e armazena o resultado em cache."""
         try:
             # Verificação de registros MX
             try:
                 mx_records = self.resolver.resolve(domain, 'MX')
                 if not mx_records:
-                    self.logger.warning(f"Domínio {domain} não possui registros MX válidos")
+                    reason = f"Domínio {domain} não possui registros MX válidos"
+                    self.logger.warning(reason)
+                    self.mx_cache.put(domain, False, reason=reason)
                     return False
+                self.mx_cache.put(domain, True, ttl=mx_records.rrset.ttl)
                 return True
             except dns.resolver.NoAnswer:
-                self.logger.warning(f"Domínio {domain} não possui registros MX")
+                reason = f"Domínio {domain} não possui registros MX"
+                self.logger.warning(reason)
+                self.mx_cache.put(domain, False, reason=reason)
                 return False
             except dns.resolver.NXDOMAIN:
-                self.logger.warning(f"Domínio {domain} não existe")
+                reason = f"Domínio {domain} não existe"
+                self.logger.warning(reason)
+                self.mx_cache.put(domain, False, reason=reason)
                 return False
             except dns.exception.Timeout:
+                # Falhas transitórias não são armazenadas em cache
                 self.logger.warning(f"Timeout ao verificar MX para {domain}")
                 return False
             except dns.exception.DNSException as e:
                 self.logger.warning(f"Erro DNS ao verificar {domain}: {str(e)}")
                 return False
         except Exception as e:
-            self.logger.error(f"Erro inesperado ao validar email {email}: {str(e)}")
+            self.logger.error(f"Erro inesperado ao validar domínio {domain}: {str(e)}")
             return False
 
-    def extract_emails_from_pdf(self, pdf_path: str) -> List[str]:
-        """Extrai e valida endereços de email de um arquivo PDF."""
+    def extract_emails_from_pdf(self, pdf_path: str, file_hash: Optional[str] = None) -> List[str]:
+        """
+        Extrai e valida endereços de email de um arquivo PDF.
+        
+        Com file_hash, os endereços extraídos são guardados no diário e
+        reutilizados quando o mesmo conteúdo reaparece (novas tentativas,
+        duplicatas). A validação DNS é sempre refeita: o cache MX a torna
+        barata e falhas temporárias de DNS não ficam guardadas.
+        """
+        use_cache = file_hash is not None and self.recipient_cache_size > 0
+        if use_cache:
+            extracted = self.journal.cached_recipients(file_hash, self.extraction_fingerprint)
+            if extracted is not None:
+                with self.metrics.timer("dns_validation"):
+                    return self.validate_emails(extracted)
+        
         try:
-            with open(pdf_path, 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
-                text = ""
-                
-                # Extrai texto de todas as páginas
-                for page in reader.pages:
-                    text += page.extract_text() or ""
-                
-                # Encontra e valida emails no texto
-                found_emails = re.findall(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', text)
-                valid_emails = [email for email in found_emails if self.validate_email(email)]
-                
-                return valid_emails
+            args = (pdf_path, self.max_pages, self.stop_on_first_match)
+            
+            with self.metrics.timer("pdf_extraction"):
+                # Com o perfil ativo a extração roda nesta thread: o amostrador
+                # não enxerga as pilhas dos processos do pool
+                if self.extraction_executor is not None and not self.tracer.profiling:
+                    try:
+                        found_emails = self.extraction_executor.submit(scan_pdf_for_emails, *args).result()
+                    except BrokenProcessPool:
+                        self.logger.warning(f"Pool de extração indisponível, extraindo {pdf_path} localmente")
+                        found_emails = scan_pdf_for_emails(*args)
+                else:
+                    found_emails = scan_pdf_for_emails(*args)
+            
+            # Valida os emails encontrados
+            with self.metrics.timer("dns_validation"):
+                validated = self.validate_emails(found_emails)
+            if use_cache:
+                self.journal.store_recipients(file_hash, self.extraction_fingerprint,
+                                              found_emails, self.recipient_cache_size)
+            return validated
         except Exception as e:
             self.logger.error(f"Erro ao extrair emails do PDF {pdf_path}: {str(e)}")
             return []
 
-    def create_email_message(self, recipient: str, pdf_path: str, error: Optional[str] = None) -> MIMEMultipart:
+    def build_attachment(self, pdf_path: str, chunk_size: int = 57 * 1024) -> MIMEApplication:
+        """
+        Cria a parte MIME com o PDF codificado em base64.
+        
+        O arquivo é lido por mapeamento em memória (mmap), sem cópias para
+        buffers de leitura, e codificado em blocos (múltiplos de 57 bytes,
+        que geram linhas completas de 76 caracteres) diretamente em um
+        buffer com o tamanho final. O pacote email exige o conteúdo como str:
+        na conversão o buffer e o texto coexistem, com pico de cerca de 2,7x
+        o tamanho do PDF; depois resta o texto (cerca de 1,35x), compartilhado
+        entre as mensagens de todos os destinatários do arquivo.
+        """
+        filename = os.path.basename(pdf_path)
+        line_size = 57
+        chunk_size = max(line_size, chunk_size - chunk_size % line_size)
+        
+        with open(pdf_path, 'rb') as attachment:
+            size = os.fstat(attachment.fileno()).st_size
+            lines = -(-size // line_size)
+            encoded = bytearray(-(-size // 3) * 4 + lines)
+            if size:
+                with mmap.mmap(attachment.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    view = memoryview(mapped)
+                    try:
+                        offset = 0
+                        for start in range(0, size, chunk_size):
+                            block = binascii.b2a_base64(view[start:start + chunk_size], newline=False)
+                            piece = b"\n".join([block[i:i + 76] for i in range(0, len(block), 76)]) + b"\n"
+                            encoded[offset:offset + len(piece)] = piece
+                            offset += len(piece)
+                    finally:
+                        view.release()
+                
+        part = MIMEApplication(b"", Name=filename, _encoder=encoders.encode_noop)
+        part.set_payload(encoded.decode('ascii'))
+        part['Content-Transfer-Encoding'] = 'base64'
+        part['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return part
+
+    def create_email_message(self, recipient: str, pdf_path: str, error: Optional[str] = None,
+                             attachment: Optional[MIMEApplication] = None) -> MIMEMultipart:
         """Cria a mensagem de email com ou sem anexo, dependendo do tipo."""
         msg = MIMEMultipart()
         msg['From'] = self.email
         msg['To'] = recipient
         filename = os.path.basename(pdf_path)
+        route = self.route_for(pdf_path)
         
         if error:
             # Email de erro
             msg['Subject'] = f"Erro no processamento do arquivo: {filename}"
-            body = self.error_template.format(nome_arquivo=filename, erro=error)
+            body = route.error_template.format(nome_arquivo=filename, erro=error)
         else:
             # Email normal com anexo
             msg['Subject'] = f"Envio automático do arquivo: {filename}"
-            body = self.email_template.format(nome_arquivo=filename)
+            body = route.email_template.format(nome_arquivo=filename)
             
         msg.attach(MIMEText(body, 'plain'))
         
         if not error:
-            # Adiciona o PDF como anexo para emails normais
-            with open(pdf_path, 'rb') as attachment:
-                part = MIMEApplication(attachment.read(), Name=filename)
-                part['Content-Disposition'] = f'attachment; filename="{filename}"'
-                msg.attach(part)
+            # Adiciona o PDF como anexo para emails normais, reaproveitando a parte já codificada
+            msg.attach(attachment if attachment is not None else self.build_attachment(pdf_path))
                 
         return msg
 
-    def send_email(self, recipient: str, pdf_path: str, error: Optional[str] = None) -> bool:
+    def send_email(self, recipient: str, pdf_path: str, error: Optional[str] = None,
+                   attachment: Optional[MIMEApplication] = None) -> bool:
         """Envia um email com o PDF anexado ou mensagem de erro."""
+        return self._try_send_email(recipient, pdf_path, error, attachment) is None
+
+    def _try_send_email(self, recipient: str, pdf_path: str, error: Optional[str] = None,
+                        attachment: Optional[MIMEApplication] = None) -> Optional[Exception]:
+        """Envia um email e retorna a exceção ocorrida (None em caso de sucesso)."""
         try:
-            msg = self.create_email_message(recipient, pdf_path, error)
+            msg = self.create_email_message(recipient, pdf_path, error, attachment)
+            
+            with self.scheduler.slot(recipient.split('@')[-1]), self.metrics.timer("smtp_send"):
+                self.transport.send_message(msg)
             
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.email, self.password)
-                server.send_message(msg)
-                
             self.logger.info(f"Email enviado com sucesso para: {recipient}")
-            return True
+            return None
         except Exception as e:
             self.logger.error(f"Erro ao enviar email para {recipient}: {str(e)}")
+            return e
+
+    def preflight_recipients(self, recipients: List[str]) -> Dict[str, str]:
+        """
+        Verifica os destinatários com RCPT TO antes do envio e retorna os recusados com o motivo.
+        
+        Os resultados ficam guardados no diário: destinatários já conhecidos
+        não geram novas consultas. Respostas temporárias (4xx) e falhas na
+        verificação não recusam ninguém; o envio normal decide.
+        """
+        rejected: Dict[str, str] = {}
+        unknown = []
+        for recipient in recipients:
+            verdict = self.journal.recipient_verdict(recipient, self.verdict_ttl,
+                                                     self.rejected_verdict_ttl)
+            if verdict is None:
+                unknown.append(recipient)
+            elif not verdict[0]:
+                rejected[recipient] = verdict[1]
+        if not unknown:
+            return rejected
+        
+        try:
+            with self.metrics.timer("smtp_preflight"):
+                replies = self.smtp_pool.verify_recipients(self.email, unknown)
+        except Exception as e:
+            self.logger.warning(f"Verificação prévia de destinatários indisponível: {str(e)}")
+            return rejected
+        
+        max_ttl = max(self.verdict_ttl, self.rejected_verdict_ttl)
+        for recipient, (code, reply) in replies.items():
+            reason = f"{code} {reply.decode('utf-8', 'replace')}"
+            if code in (250, 251):
+                self.journal.store_verdict(recipient, True, reason, max_ttl)
+            elif 500 <= code < 600:
+                self.journal.store_verdict(recipient, False, reason, max_ttl)
+                rejected[recipient] = reason
+        return rejected
+
+    def batching_mode(self, pdf_path: str) -> str:
+        """Modo de agrupamento de destinatários aplicável à rota e à subpasta do arquivo."""
+        default = self.route_for(pdf_path).recipient_batching or self.recipient_batching
+        return self.folder_batching.get(self.relative_folder(pdf_path), default)
+
+    def send_to_recipients(self, recipients: List[str], pdf_path: str,
+                           attachment: MIMEApplication) -> Iterator[Tuple[str, Optional[Exception]]]:
+        """
+        Envia o PDF aos destinatários e gera (destinatário, exceção ou None).
+        
+        Fora do modo agrupado cada resultado é gerado logo após o respectivo
+        envio, permitindo registrá-lo antes do próximo.
+        """
+        mode = self.batching_mode(pdf_path)
+        if mode == "off" or len(recipients) < 2:
+            for recipient in recipients:
+                yield recipient, self._try_send_email(recipient, pdf_path, attachment=attachment)
+            return
+        yield from self._try_send_batch(recipients, pdf_path, attachment, mode).items()
+
+    def _try_send_batch(self, recipients: List[str], pdf_path: str, attachment: MIMEApplication,
+                        mode: str) -> Dict[str, Optional[Exception]]:
+        """
+        Envia uma única mensagem a todos os destinatários e retorna o resultado de cada um,
+        a partir das respostas ao RCPT TO.
+        """
+        header = ", ".join(recipients) if mode == "to" else "undisclosed-recipients:;"
+        try:
+            msg = self.create_email_message(header, pdf_path, attachment=attachment)
+            # A transação consome uma ficha de cada domínio de destino
+            domains = [recipient.split('@')[-1] for recipient in recipients]
+            with self.scheduler.slot(*domains), self.metrics.timer("smtp_send"):
+                refused = self.transport.send_message(msg, to_addrs=recipients)
+        except smtplib.SMTPRecipientsRefused as e:
+            refused = e.recipients
+        except Exception as e:
+            self.logger.error(f"Erro ao enviar email para {len(recipients)} destinatário(s): {str(e)}")
+            return {recipient: e for recipient in recipients}
+        
+        results: Dict[str, Optional[Exception]] = {}
+        for recipient in recipients:
+            if recipient in refused:
+                results[recipient] = smtplib.SMTPRecipientsRefused({recipient: refused[recipient]})
+                self.logger.error(f"Destinatário recusado {recipient}: {refused[recipient]}")
+            else:
+                results[recipient] = None
+                self.logger.info(f"Email enviado com sucesso para: {recipient}")
+        return results
+
+    def is_retrying(self, pdf_path: str) -> bool:
+        """Indica se o arquivo aguarda novas tentativas de envio registradas no diário."""
+        try:
+            return self.journal.status(self.journal.file_hash(pdf_path)) == "retrying"
+        except OSError:
             return False
 
+    def retry_delay(self, attempts: int) -> float:
+        """Espera antes da próxima tentativa: backoff exponencial com jitter."""
+        delay = min(self.retry_max_delay, self.retry_base_delay * 2 ** (attempts - 1))
+        return random.uniform(delay / 2, delay)
+
     def move_file(self, source: str, destination_folder: str) -> Optional[str]:
-        """Move um arquivo para a pasta de destino especificada."""
+        """
+        Move um arquivo para a pasta de destino especificada.
+        
+        Renomeia quando origem e destino estão no mesmo volume; entre volumes
+        diferentes copia para um arquivo temporário no destino, grava em
+        disco (fsync), publica com uma renomeação atômica e só então remove a
+        origem, de modo que uma falha no meio nunca perde o arquivo. Se já
+        existir um arquivo com o mesmo nome, usa "nome (1).pdf", "nome (2).pdf"...
+        """
         try:
-            if not os.path.exists(destination_folder):
-                os.makedirs(destination_folder)
-                
-            destination = os.path.join(destination_folder, os.path.basename(source))
-            os.rename(source, destination)
+            os.makedirs(destination_folder, exist_ok=True)
+            destination = reserve_destination(destination_folder, os.path.basename(source))
+            try:
+                # Substitui o arquivo vazio que reservou o nome
+                os.replace(source, destination)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    discard_reservation(destination)
+                    raise
+                try:
+                    self._copy_across_devices(source, destination)
+                except BaseException:
+                    discard_reservation(destination)
+                    raise
             
             return destination
         except Exception as e:
             self.logger.error(f"Erro ao mover arquivo {source}: {str(e)}")
             return None
 
+    @staticmethod
+    def _copy_across_devices(source: str, destination: str) -> None:
+        """Copia entre volumes com fsync e renomeação atômica; remove a origem ao final."""
+        folder = os.path.dirname(destination)
+        partial = os.path.join(folder, f".{os.path.basename(destination)}.partial")
+        try:
+            # Usa cópia no kernel (sendfile/fcopyfile) quando disponível
+            shutil.copyfile(source, partial)
+            shutil.copystat(source, partial)
+            with open(partial, 'rb') as copied:
+                os.fsync(copied.fileno())
+            os.replace(partial, destination)
+        except BaseException:
+            try:
+                os.remove(partial)
+            except OSError:
+                pass
+            raise
+        
+        if hasattr(os, "O_DIRECTORY"):
+            # Persiste a entrada do diretório antes de apagar a origem
+            directory = os.open(folder, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(directory)
+            finally:
+                os.close(directory)
+        os.remove(source)
+
+    def route_for(self, path: str) -> FolderRoute:
+        """Rota cuja pasta contém o arquivo (a mais específica); a principal se nenhuma contiver."""
+        matches = [route for route in self.routes if route.contains(path)]
+        if not matches:
+            return self.routes[0]
+        return max(matches, key=lambda route: len(os.path.abspath(route.monitor_folder)))
+
+    def is_candidate(self, path: str) -> bool:
+        """Indica se o caminho é um PDF a processar (ignora pastas ocultas, como .processing)."""
+        if not path.lower().endswith('.pdf'):
+            return False
+        route = self.route_for(path)
+        relative = os.path.relpath(os.path.abspath(path), os.path.abspath(route.monitor_folder))
+        return not any(part.startswith('.') for part in relative.split(os.sep)[:-1])
+
+    def relative_folder(self, pdf_path: str) -> str:
+        """Subpasta do arquivo relativa à pasta da sua rota ("" na raiz ou fora dela)."""
+        route = self.route_for(pdf_path)
+        folder = os.path.abspath(os.path.dirname(pdf_path))
+        origin = os.path.abspath(route.monitor_folder)
+        if route.claims is not None and (folder + os.sep).startswith(
+                os.path.abspath(route.claims.node_folder) + os.sep):
+            origin = os.path.abspath(route.claims.node_folder)
+        relative = os.path.relpath(folder, origin)
+        if relative == os.curdir or relative.startswith(os.pardir):
+            return ""
+        return relative
+
+    def route_folder(self, pdf_path: str, base_folder: str) -> str:
+        """
+        Pasta de destino do arquivo: no modo recursivo, a subpasta de
+        base_folder correspondente à subpasta de origem.
+        """
+        relative = self.relative_folder(pdf_path)
+        return os.path.join(base_folder, relative) if relative else base_folder
+
+    def create_observer(self):
+        """Cria e configura o observador da pasta monitorada conforme observer_mode."""
+        if self.observer_mode == "polling":
+            observer = DirectoryScanner(self.poll_interval, self.poll_max_interval, logger=self.logger)
+        else:
+            observer = Observer()
+        for route in self.routes:
+            observer.schedule(self, route.monitor_folder, recursive=self.recursive)
+        return observer
+
     def on_created(self, event) -> None:
         """Método chamado quando um novo arquivo é detectado na pasta monitorada."""
-        if not event.is_directory and event.src_path.lower().endswith('.pdf'):
+        if not event.is_directory and self.is_candidate(event.src_path):
             self.logger.info(f"Novo arquivo PDF detectado: {event.src_path}")
-            time.sleep(2)  # Espera para garantir que o arquivo esteja completamente escrito
-            self.process_pdf(event.src_path)
+            self.readiness.watch(event.src_path)
+
+    def on_modified(self, event) -> None:
+        """Método chamado quando um arquivo da pasta monitorada é alterado."""
+        if not event.is_directory and self.is_candidate(event.src_path):
+            self.readiness.watch(event.src_path)
+
+    def on_closed(self, event) -> None:
+        """Método chamado quando um arquivo aberto para escrita é fechado."""
+        if not event.is_directory and self.is_candidate(event.src_path):
+            self.readiness.notify_closed(event.src_path)
+
+    def on_moved(self, event) -> None:
+        """Método chamado quando um arquivo é renomeado para dentro da pasta monitorada."""
+        if not event.is_directory and self.is_candidate(event.dest_path):
+            self.logger.info(f"Novo arquivo PDF detectado: {event.dest_path}")
+            self.readiness.watch(event.dest_path, closed=True)
+
+    def enqueue(self, pdf_path: str, block: bool = True) -> bool:
+        """
+        Coloca um arquivo na fila de processamento da sua rota.
+        
+        Com block=True, bloqueia enquanto a fila da rota estiver cheia. Com
+        block=False, o arquivo aguarda na reserva da rota e entra na fila
+        quando um worker liberar espaço nela, sem novas verificações do
+        arquivo e sem atrasar a detecção das demais rotas. Retorna False se
+        o arquivo já estiver na fila ou em processamento.
+        """
+        with self._pending_lock:
+            if pdf_path in self._pending:
+                return False
+            self._pending.add(pdf_path)
+        
+        self.work_queue.put(pdf_path, self.route_for(pdf_path).name, block=block)
+        return True
+
+    def start_workers(self) -> None:
+        """Inicia as threads que consomem a fila de processamento."""
+        if self._worker_threads:
+            return
+            
+        self.readiness.start()
+        self.retries.start()
+        self.metrics_exporter.start()
+        if self.tracing:
+            self.start_tracing()
+        for route in self.routes:
+            if route.claims is not None:
+                route.claims.start()
+        
+        # Retoma os reenvios pendentes registrados no diário
+        for path, next_attempt in self.journal.pending_retries():
+            self.retries.schedule(path, next_attempt)
+            
+        for i in range(self.workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"PDFWorker-{i + 1}")
+            worker.daemon = True
+            worker.start()
+            self._worker_threads.append(worker)
+
+    def start_tracing(self) -> None:
+        """Ativa o rastreamento das etapas (e o perfil, se configurado)."""
+        try:
+            self.tracer.start(profile=self.profiling)
+        except OSError as e:
+            self.logger.error(f"Erro ao abrir arquivo de rastreamento {self.tracer.trace_path}: {str(e)}")
+
+    def toggle_tracing(self) -> bool:
+        """Alterna o rastreamento em execução e retorna se ele ficou ativo."""
+        if self.tracer.enabled:
+            self.tracer.stop()
+        else:
+            self.start_tracing()
+        return self.tracer.enabled
+
+    def stop_workers(self, timeout: Optional[float] = None) -> None:
+        """Sinaliza o fim para as threads de processamento e aguarda seu término."""
+        self.readiness.stop(timeout=0)
+        self.retries.stop(timeout=0)
+        
+        # Descarta o que ainda não começou: os arquivos continuam na pasta monitorada
+        while True:
+            try:
+                pdf_path = self.work_queue.get_nowait()
+            except queue.Empty:
+                break
+            with self._pending_lock:
+                self._pending.discard(pdf_path)
+            self.work_queue.task_done()
+
+        for _ in self._worker_threads:
+            self.work_queue.put_control(None)
+        for worker in self._worker_threads:
+            worker.join(timeout)
+        self._worker_threads = []
+
+    def _worker_loop(self) -> None:
+        """Laço executado por cada worker: consome a fila até receber o sinal de parada."""
+        while True:
+            pdf_path = self.work_queue.get()
+            try:
+                if pdf_path is None:
+                    return
+                with self._pending_lock:
+                    self._in_flight += 1
+                try:
+                    self.process_pdf(pdf_path)
+                finally:
+                    with self._pending_lock:
+                        self._in_flight -= 1
+            except Exception as e:
+                self.logger.error(f"Erro inesperado no worker ao processar {pdf_path}: {str(e)}")
+            finally:
+                if pdf_path is not None:
+                    with self._pending_lock:
+                        self._pending.discard(pdf_path)
+                self.work_queue.task_done()
+
+    def scan_backlog(self) -> int:
+        """
+        Enfileira os PDFs que já estavam na pasta monitorada antes do início.
+        
+        Arquivos já concluídos segundo o diário são reconhecidos pelo hash em
+        process_pdf, sem novos envios.
+        """
+        count = 0
+        folders = [route.monitor_folder for route in self.routes]
+        while folders:
+            folder = folders.pop()
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        if entry.name.startswith('.'):
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            if self.recursive:
+                                folders.append(entry.path)
+                        elif entry.is_file() and entry.name.lower().endswith('.pdf'):
+                            self.readiness.watch(entry.path, closed=True)
+                            count += 1
+            except OSError as e:
+                self.logger.error(f"Erro ao verificar arquivos pendentes em {folder}: {str(e)}")
+            
+        if count:
+            self.logger.info(f"{count} arquivo(s) PDF pendente(s) encontrado(s) na pasta monitorada")
+        return count
 
     def process_pdf(self, pdf_path: str) -> None:
         """Processa um arquivo PDF, extrai emails e envia mensagens."""
+        route = self.route_for(pdf_path)
+        if route.claims is not None:
+            claimed = route.claims.claim(pdf_path)
+            if claimed is None:
+                self.logger.info(f"Arquivo {pdf_path} assumido por outra instância")
+                return
+            pdf_path = claimed
+            
+        with self.tracer.document(pdf_path):
+            self._process_file(pdf_path, route)
+
+    def _process_file(self, pdf_path: str, route: FolderRoute) -> None:
+        """Processa um arquivo já reivindicado: envio, novas tentativas e destino final."""
         try:
-            emails = self.extract_emails_from_pdf(pdf_path)
+            file_hash = self.journal.file_hash(pdf_path)
+            previous_status = self.journal.status(file_hash)
+            if previous_status == "sent":
+                self.logger.info(f"Arquivo {pdf_path} já foi enviado anteriormente; nenhum email reenviado")
+                self.tracer.annotate("duplicate")
+                self.move_file(pdf_path, self.route_folder(pdf_path, route.sent_folder))
+                return
+            if previous_status == "error":
+                # Arquivo devolvido à pasta após falha definitiva: tenta de novo os que falharam
+                self.journal.reset_failures(file_hash)
+                
+            self.journal.begin(file_hash, pdf_path)
+            delivered = self.journal.delivered(file_hash)
+            failures = self.journal.retry_states(file_hash)
+            
+            emails = self.extract_emails_from_pdf(pdf_path, file_hash)
             processed = 1
             sent = 0
             errors = 0
             
             if emails:
-                success = True
+                # Destinatários válidos ainda sem entrega e sem espera de nova tentativa
+                due = []
+                for email in dict.fromkeys(emails):
+                    if email in delivered:
+                        self.logger.info(f"Arquivo já entregue anteriormente para: {email}")
+                        continue
+                        
+                    status, _, next_attempt = failures.get(email, ("", 0, 0.0))
+                    if status == "failed" or (status == "pending" and next_attempt > time.time()):
+                        continue
+                    due.append(email)
+                
+                # Endereços recusados pelo servidor não custam a montagem nem o envio do anexo
+                if self.preflight_verification and due:
+                    rejected = self.preflight_recipients(due)
+                    for email, reason in rejected.items():
+                        self.logger.warning(f"Destinatário recusado na verificação prévia: {email} ({reason})")
+                        attempts = failures.get(email, ("", 0, 0.0))[1] + 1
+                        failures[email] = ("failed", attempts, 0.0)
+                        errors += 1
+                        self.journal.record_failure(file_hash, email, pdf_path, "failed", attempts, 0.0, reason)
+                    due = [email for email in due if email not in rejected]
+                
+                # O anexo é codificado uma única vez e compartilhado entre os destinatários
+                attachment = None
+                if due:
+                    with self.metrics.timer("mime_build"):
+                        attachment = self.build_attachment(pdf_path)
                 
-                # Envia email para cada destinatário válido
-                for email in emails:
-                    if self.send_email(email, pdf_path):
+                # No modo agrupado todos os resultados vêm de uma única transação:
+                # as falhas temporárias recebem o mesmo horário e voltam juntas
+                batched = self.batching_mode(pdf_path) != "off"
+                batch_retry_at = None
+                for email, send_error in self.send_to_recipients(due, pdf_path, attachment):
+                    status, attempts, next_attempt = failures.get(email, ("", 0, 0.0))
+                    if send_error is None:
+                        self.journal.record_delivery(file_hash, email)
+                        if status:
+                            self.journal.clear_failure(file_hash, email)
+                        failures.pop(email, None)
+                        delivered.add(email)
                         sent += 1
+                        continue
+                        
+                    attempts += 1
+                    if is_transient_smtp_error(send_error) and attempts < self.retry_max_attempts:
+                        if not batched or batch_retry_at is None:
+                            batch_retry_at = time.time() + self.retry_delay(attempts)
+                        next_attempt = batch_retry_at
+                        failures[email] = ("pending", attempts, next_attempt)
+                        self.logger.warning(
+                            f"Falha temporária no envio para {email} (tentativa {attempts}); "
+                            f"nova tentativa em {next_attempt - time.time():.0f}s")
                     else:
-                        success = False
+                        failures[email] = ("failed", attempts, next_attempt)
                         errors += 1
+                    self.journal.record_failure(file_hash, email, pdf_path, failures[email][0],
+                                                attempts, next_attempt, str(send_error))
                 
-                # Move o arquivo para a pasta apropriada
-                if success:
-                    self.move_file(pdf_path, self.sent_folder)
+                pending = [state[2] for state in failures.values() if state[0] == "pending"]
+                failed = [email for email, state in failures.items() if state[0] == "failed"]
+                
+                # Mantém o arquivo na pasta enquanto houver novas tentativas agendadas
+                if pending:
+                    processed = 0  # Contabilizado apenas quando o arquivo for concluído
+                    self.tracer.annotate("retrying")
+                    self.journal.finish(file_hash, "retrying")
+                    self.retries.schedule(pdf_path, min(pending))
+                    self.logger.info(f"Arquivo {pdf_path} aguardando novas tentativas para "
+                                     f"{len(pending)} destinatário(s)")
+                elif not failed:
+                    self.tracer.annotate("sent")
+                    self.journal.finish(file_hash, "sent")
+                    self.move_file(pdf_path, self.route_folder(pdf_path, route.sent_folder))
                     self.logger.info(f"Arquivo {pdf_path} processado com sucesso e movido para enviados")
                 else:
-                    self.move_file(pdf_path, self.error_folder)
+                    # Notifica apenas os destinatários que falharam definitivamente
+                    self.send_email(self.email, pdf_path, error=(
+                        "Falha definitiva no envio para: " + ", ".join(failed)))
+                    self.tracer.annotate("error")
+                    self.journal.finish(file_hash, "error")
+                    self.move_file(pdf_path, self.route_folder(pdf_path, route.error_folder))
                     self.logger.warning(f"Arquivo {pdf_path} movido para erros devido a falhas no envio")
                     errors += 1
             else:
@@ -234,14 +3361,37 @@ class PDFHandler(FileSystemEventHandler):
                 
                 # Envia email de notificação de erro
                 self.send_email(self.email, pdf_path, error=error_msg)
-                self.move_file(pdf_path, self.error_folder)
+                self.tracer.annotate("no_recipients")
+                self.journal.finish(file_hash, "error")
+                self.move_file(pdf_path, self.route_folder(pdf_path, route.error_folder))
                 errors += 1
                 
             self.update_stats(processed, sent, errors)
         except Exception as e:
             self.logger.error(f"Erro ao processar arquivo {pdf_path}: {str(e)}")
+            self.tracer.annotate(type(e).__name__)
             self.update_stats(1, 0, 1)
-            self.move_file(pdf_path, self.error_folder)
+            self.move_file(pdf_path, self.route_folder(pdf_path, route.error_folder))
+
+    def close(self) -> None:
+        """Encerra os workers e libera os recursos mantidos pelo handler."""
+        self.stop_workers()
+        for route in self.routes:
+            if route.claims is not None:
+                route.claims.stop()
+        self.metrics_exporter.stop()
+        self.tracer.stop()
+        self.dns_executor.shutdown(wait=False)
+        if self.extraction_executor is not None:
+            self.extraction_executor.shutdown(wait=False)
+        if self.transport is not self.smtp_pool:
+            self.transport.close()
+        self.smtp_pool.close()
+        try:
+            self.mx_cache.save()
+        except OSError as e:
+            self.logger.error(f"Erro ao salvar cache MX: {str(e)}")
+        self.journal.close()
 
 class EmailAutomationApp:
     """Classe principal da aplicação com interface gráfica."""
@@ -254,10 +3404,17 @@ class EmailAutomationApp:
         
         self.monitoring = False
         self.observer = None
+        self.event_handler = None
+        # Mantido entre sessões de monitoramento e salvo em disco ao parar
+        self.mx_cache = MXCache(persist_path=DEFAULT_SETTINGS["mx_cache_path"])
+        
+        self.stats = StatsCounter()
         
         self.load_default_settings()
         self.create_widgets()
         self.setup_logging()
+        self.root.after(GUI_REFRESH_INTERVAL, self.refresh_stats)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def setup_logging(self) -> None:
         """Configura o sistema de logging da aplicação."""
@@ -271,6 +3428,10 @@ class EmailAutomationApp:
         self.log_handler.setFormatter(formatter)
         
         self.logger.addHandler(self.log_handler)
+        
+        # Histórico completo em arquivo com rotação
+        self.log_path = DEFAULT_SETTINGS["log_file"]
+        self.log_listener = start_file_logging(self.logger, self.log_path, formatter)
 
     def load_default_settings(self) -> None:
         """Carrega as configurações padrão da aplicação."""
@@ -281,23 +3442,20 @@ class EmailAutomationApp:
         self.password_var = ctk.StringVar(value="")  # Sua senha
         
         # Pastas padrão
-        documents_path = os.path.join(os.path.expanduser("~"), "Documents")
-        self.folder_var = ctk.StringVar(value=os.path.join(documents_path, "PDF_Enviar"))
-        self.sent_folder_var = ctk.StringVar(value=os.path.join(documents_path, "PDF_Enviados"))
-        self.error_folder_var = ctk.StringVar(value=os.path.join(documents_path, "PDF_Erros"))
+        self.folder_var = ctk.StringVar(value=DEFAULT_SETTINGS["monitor_folder"])
+        self.sent_folder_var = ctk.StringVar(value=DEFAULT_SETTINGS["sent_folder"])
+        self.error_folder_var = ctk.StringVar(value=DEFAULT_SETTINGS["error_folder"])
         
         # Templates de email
-        self.email_template_var = ctk.StringVar(
-            value="""Olá,\n\nSegue em anexo o arquivo {nome_arquivo} conforme solicitado.\n\nAtenciosamente,\nSistema Automático de Envio de Emails""")
-        
-        self.error_template_var = ctk.StringVar(
-            value="""Olá,\n\nIdentificamos um problema ao processar o arquivo {nome_arquivo}:\n\n{erro}\n\nPor favor, verifique e tente novamente.\n\nAtenciosamente,\nSistema Automático de Envio de Emails""")
+        self.email_template_var = ctk.StringVar(value=DEFAULT_EMAIL_TEMPLATE)
+        self.error_template_var = ctk.StringVar(value=DEFAULT_ERROR_TEMPLATE)
         
         # Status e estatísticas
         self.status_var = ctk.StringVar(value="Monitoramento: INATIVO")
         self.processed_var = ctk.StringVar(value="0")
         self.emails_sent_var = ctk.StringVar(value="0")
         self.errors_var = ctk.StringVar(value="0")
+        self.metrics_var = ctk.StringVar(value="Sem dados")
 
     def create_widgets(self) -> None:
         """Cria todos os widgets da interface gráfica."""
@@ -405,6 +3563,10 @@ class EmailAutomationApp:
         ctk.CTkButton(tab, text="Testar Configurações", 
                       command=self.test_settings).pack(pady=5)
         
+        self.trace_button = ctk.CTkButton(
+            tab, text="Iniciar Rastreamento", command=self.toggle_tracing, state="disabled")
+        self.trace_button.pack(pady=5)
+        
         # Frame de estatísticas
         stats_frame = ctk.CTkFrame(tab)
         stats_frame.pack(fill="x", pady=10, padx=10)
@@ -422,6 +3584,14 @@ class EmailAutomationApp:
         
         ctk.CTkLabel(stats_grid, text="Erros Encontrados:").grid(row=2, column=0, sticky="w", padx=5, pady=2)
         ctk.CTkLabel(stats_grid, textvariable=self.errors_var).grid(row=2, column=1, sticky="e", padx=5, pady=2)
+        
+        # Frame de desempenho (resumo das métricas do pipeline)
+        metrics_frame = ctk.CTkFrame(tab)
+        metrics_frame.pack(fill="x", pady=10, padx=10)
+        
+        ctk.CTkLabel(metrics_frame, text="Desempenho", font=("Arial", 14, "bold")).pack(pady=(5, 10))
+        ctk.CTkLabel(metrics_frame, textvariable=self.metrics_var, justify="left",
+                     font=("Courier", 12)).pack(anchor="w", padx=5, pady=(0, 5))
 
     def create_logs_tab(self) -> None:
         """Cria a aba de logs da aplicação."""
@@ -528,7 +3698,7 @@ class EmailAutomationApp:
         
         try:
             # Cria o handler para monitorar a pasta
-            event_handler = PDFHandler(
+            self.event_handler = PDFHandler(
                 smtp_server=self.smtp_server_var.get(),
                 smtp_port=int(self.smtp_port_var.get()),
                 email=self.email_var.get(),
@@ -539,22 +3709,29 @@ class EmailAutomationApp:
                 email_template=self.email_template_var.get(),
                 error_template=self.error_template_var.get(),
                 update_stats_callback=self.update_stats,
-                logger=self.logger
+                logger=self.logger,
+                mx_cache=self.mx_cache,
+                journal_path=DEFAULT_SETTINGS["journal_path"]
             )
             
+            self.event_handler.start_workers()
+            
             # Configura e inicia o observer
-            self.observer = Observer()
-            self.observer.schedule(event_handler, self.folder_var.get(), recursive=False)
+            self.observer = self.event_handler.create_observer()
             
             # Inicia o monitoramento em uma thread separada
             monitoring_thread = threading.Thread(target=self.observer.start)
             monitoring_thread.daemon = True
             monitoring_thread.start()
             
+            # Processa os PDFs que já estavam na pasta antes do início
+            self.event_handler.scan_backlog()
+            
             self.monitoring = True
             self.status_var.set("Monitoramento: ATIVO")
             self.start_button.configure(state="disabled")
             self.stop_button.configure(state="normal")
+            self.trace_button.configure(state="normal", text="Iniciar Rastreamento")
             
             messagebox.showinfo("Sucesso", "Monitoramento iniciado com sucesso!")
             self.logger.info("Monitoramento iniciado")
@@ -572,11 +3749,14 @@ class EmailAutomationApp:
             self.observer.stop()
             self.observer.join()
             self.observer = None
+            self.event_handler.close()
+            self.event_handler = None
             self.monitoring = False
             
             self.status_var.set("Monitoramento: INATIVO")
             self.start_button.configure(state="normal")
             self.stop_button.configure(state="disabled")
+            self.trace_button.configure(state="disabled", text="Iniciar Rastreamento")
             
             messagebox.showinfo("Sucesso", "Monitoramento parado com sucesso!")
             self.logger.info("Monitoramento parado")
@@ -585,24 +3765,79 @@ class EmailAutomationApp:
             messagebox.showerror("Erro", f"Falha ao parar monitoramento: {str(e)}")
             self.logger.error(f"Erro ao parar monitoramento: {str(e)}")
 
+    def toggle_tracing(self) -> None:
+        """Ativa ou desativa o rastreamento (com perfil) do monitoramento em curso."""
+        if self.event_handler is None:
+            return
+        self.event_handler.profiling = True
+        active = self.event_handler.toggle_tracing()
+        self.trace_button.configure(text="Parar Rastreamento" if active else "Iniciar Rastreamento")
+        if not active:
+            messagebox.showinfo("Rastreamento", f"Spans gravados em {self.event_handler.tracer.trace_path}\n"
+                                f"Perfil em {self.event_handler.tracer.profile_path}")
+
     def update_stats(self, processed: int = 0, sent: int = 0, errors: int = 0) -> None:
-        """Atualiza as estatísticas exibidas na interface."""
-        current_processed = int(self.processed_var.get())
-        current_sent = int(self.emails_sent_var.get())
-        current_errors = int(self.errors_var.get())
+        """Acumula os incrementos das estatísticas (pode ser chamado de qualquer thread)."""
+        self.stats.add(processed, sent, errors)
+
+    def refresh_stats(self) -> None:
+        """Exibe as estatísticas acumuladas; executado periodicamente no event loop do Tk."""
+        processed, sent, errors = self.stats.snapshot()
         
-        self.processed_var.set(str(current_processed + processed))
-        self.emails_sent_var.set(str(current_sent + sent))
-        self.errors_var.set(str(current_errors + errors))
+        for var, value in ((self.processed_var, processed), (self.emails_sent_var, sent),
+                           (self.errors_var, errors)):
+            if var.get() != str(value):
+                var.set(str(value))
+                
+        if self.event_handler is not None:
+            summary = self.format_metrics(self.event_handler.metrics.snapshot())
+            if self.metrics_var.get() != summary:
+                self.metrics_var.set(summary)
+                
+        self.root.after(GUI_REFRESH_INTERVAL, self.refresh_stats)
+
+    @staticmethod
+    def format_metrics(snapshot: Dict[str, object]) -> str:
+        """Resume um snapshot das métricas em texto para a aba de monitoramento."""
+        labels = {
+            "detect_ready": "Detecção → pronto",
+            "pdf_extraction": "Extração do PDF",
+            "dns_validation": "Validação DNS",
+            "smtp_preflight": "Verificação prévia",
+            "mime_build": "Montagem MIME",
+            "smtp_connect": "Conexão SMTP",
+            "smtp_send": "Envio SMTP",
+        }
+        lines = []
+        for stage, label in labels.items():
+            data = snapshot["stages"].get(stage)
+            if data and data["count"]:
+                lines.append(f"{label:<20} p50 {data['p50_seconds'] * 1000:>7.0f} ms   "
+                             f"p99 {data['p99_seconds'] * 1000:>7.0f} ms   ({data['count']})")
+                             
+        gauges = snapshot["gauges"]
+        lines.append(f"Fila: {gauges.get('queue_depth', 0):.0f}   "
+                     f"Em processamento: {gauges.get('files_in_flight', 0):.0f}   "
+                     f"Cache MX: {gauges.get('mx_cache_hit_ratio', 0) * 100:.0f}%")
+        return "\n".join(lines)
+
+    def on_close(self) -> None:
+        """Encerra o monitoramento e grava os logs pendentes antes de fechar a janela."""
+        if self.monitoring and self.observer:
+            self.observer.stop()
+            self.observer.join()
+            self.event_handler.close()
+        self.log_listener.stop()
+        self.root.destroy()
 
     def clear_logs(self) -> None:
-        """Limpa todos os logs exibidos."""
+        """Limpa todos os logs exibidos (o arquivo de log é mantido)."""
         self.log_text.configure(state="normal")
         self.log_text.delete("1.0", "end")
         self.log_text.configure(state="disabled")
 
     def export_logs(self) -> None:
-        """Exporta os logs para um arquivo."""
+        """Exporta o histórico completo de logs (arquivo em disco) para um arquivo."""
         file_path = filedialog.asksaveasfilename(
             defaultextension=".log",
             filetypes=[("Arquivos de Log", "*.log"), ("Todos os arquivos", "*.*")]
@@ -610,8 +3845,14 @@ class EmailAutomationApp:
         
         if file_path:
             try:
-                with open(file_path, "w", encoding="utf-8") as f:
-                    f.write(self.log_text.get("1.0", "end-1c"))
+                # Garante que os registros ainda na fila cheguem ao disco
+                self.log_listener.stop()
+                self.log_listener.start()
+                
+                with open(file_path, "wb") as output:
+                    for log_file in rotated_log_files(self.log_path):
+                        with open(log_file, "rb") as source:
+                            shutil.copyfileobj(source, output)
                     
                 messagebox.showinfo("Sucesso", f"Logs exportados para: {file_path}")
                 self.logger.info(f"Logs exportados para: {file_path}")
@@ -620,8 +3861,184 @@ class EmailAutomationApp:
                 messagebox.showerror("Erro", f"Falha ao exportar logs: {str(e)}")
                 self.logger.error(f"Erro ao exportar logs: {str(e)}")
 
-if __name__ == "__main__":
-    # Inicializa a aplicação
+# Configurações do modo servidor: valores padrão, sobrescritos pelo arquivo JSON e
+# depois pelas variáveis de ambiente AUTOMACAO_<CHAVE> (ex.: AUTOMACAO_SMTP_SERVER).
+# Chaves adicionais são repassadas ao PDFHandler (ex.: "workers", "max_pages").
+_DOCUMENTS_PATH = os.path.join(os.path.expanduser("~"), "Documents")
+
+DEFAULT_SETTINGS = {
+    "smtp_server": "",
+    "smtp_port": 587,
+    "email": "",
+    "password": "",
+    "monitor_folder": os.path.join(_DOCUMENTS_PATH, "PDF_Enviar"),
+    "sent_folder": os.path.join(_DOCUMENTS_PATH, "PDF_Enviados"),
+    "error_folder": os.path.join(_DOCUMENTS_PATH, "PDF_Erros"),
+    "email_template": DEFAULT_EMAIL_TEMPLATE,
+    "error_template": DEFAULT_ERROR_TEMPLATE,
+    "journal_path": os.path.join(APP_DATA_DIR, "journal.db"),
+    "mx_cache_path": os.path.join(APP_DATA_DIR, "mx_cache.json"),
+    "log_level": "INFO",
+    "log_file": os.path.join(APP_DATA_DIR, "logs", "automacao.log"),
+}
+
+# Chaves usadas pela aplicação e que não são parâmetros do PDFHandler
+APP_SETTINGS = ("mx_cache_path", "log_level", "log_file")
+
+ENV_PREFIX = "AUTOMACAO_"
+
+def _handler_parameters() -> Dict[str, inspect.Parameter]:
+    """Parâmetros configuráveis do PDFHandler."""
+    params = dict(inspect.signature(PDFHandler.__init__).parameters)
+    for name in ("self", "update_stats_callback", "logger", "mx_cache"):
+        params.pop(name, None)
+    return params
+
+def _convert_setting(raw: str, default) -> object:
+    """Converte o valor textual de uma variável de ambiente para o tipo da configuração."""
+    if isinstance(default, bool):
+        return raw.strip().lower() in ("1", "true", "yes", "sim", "on")
+    if isinstance(default, int):
+        return int(raw)
+    if isinstance(default, float):
+        return float(raw)
+    if isinstance(default, str):
+        return raw
+    # Parâmetros sem valor padrão tipado (ex.: None) aceitam JSON: 10, null, true...
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return raw
+
+def load_settings(config_path: Optional[str] = None,
+                  environ: Optional[Dict[str, str]] = None) -> Dict[str, object]:
+    """
+    Monta as configurações do modo servidor.
+    
+    Args:
+        config_path: Arquivo JSON opcional com as configurações
+        environ: Variáveis de ambiente (padrão: os.environ)
+    """
+    environ = os.environ if environ is None else environ
+    settings: Dict[str, object] = dict(DEFAULT_SETTINGS)
+    params = _handler_parameters()
+    
+    if config_path:
+        with open(config_path, "r", encoding="utf-8") as f:
+            settings.update(json.load(f))
+            
+    known = {name: settings.get(name, param.default) for name, param in params.items()}
+    known.update({name: DEFAULT_SETTINGS[name] for name in APP_SETTINGS})
+    for name, default in known.items():
+        raw = environ.get(ENV_PREFIX + name.upper())
+        if raw is not None:
+            settings[name] = _convert_setting(raw, default)
+            
+    unknown = set(settings) - set(params) - set(APP_SETTINGS)
+    if unknown:
+        raise ValueError(f"Configurações desconhecidas: {', '.join(sorted(unknown))}")
+        
+    required = ["smtp_server", "email", "monitor_folder"]
+    # Sem TLS (relay local), a senha vazia envia sem autenticação
+    if settings.get("smtp_use_tls", params["smtp_use_tls"].default):
+        required.append("password")
+    missing = [name for name in required if not settings.get(name)]
+    if missing:
+        raise ValueError(f"Configurações obrigatórias ausentes: {', '.join(missing)}")
+        
+    return settings
+
+def run_headless(settings: Dict[str, object]) -> None:
+    """Executa o monitoramento sem interface gráfica até receber SIGINT/SIGTERM."""
+    logger = logging.getLogger('EmailAutomation')
+    logger.setLevel(str(settings["log_level"]).upper())
+    
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    if not logger.handlers:
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(formatter)
+        logger.addHandler(stream_handler)
+    log_listener = None
+    if settings["log_file"]:
+        log_listener = start_file_logging(logger, str(settings["log_file"]), formatter)
+    
+    stats = StatsCounter()
+    
+    def update_stats(processed: int = 0, sent: int = 0, errors: int = 0) -> None:
+        total_processed, total_sent, total_errors = stats.add(processed, sent, errors)
+        logger.info(f"Estatísticas: {total_processed} arquivo(s) processado(s), "
+                    f"{total_sent} email(s) enviado(s), {total_errors} erro(s)")
+    
+    for folder in (settings["monitor_folder"], settings["sent_folder"], settings["error_folder"]):
+        os.makedirs(str(folder), exist_ok=True)
+    
+    handler_settings = {name: value for name, value in settings.items() if name not in APP_SETTINGS}
+    event_handler = PDFHandler(
+        update_stats_callback=update_stats,
+        logger=logger,
+        mx_cache=MXCache(persist_path=settings["mx_cache_path"] or None),
+        **handler_settings
+    )
+    event_handler.start_workers()
+    
+    observer = event_handler.create_observer()
+    observer.start()
+    event_handler.scan_backlog()
+    logger.info("Monitoramento iniciado (modo servidor)")
+    
+    stop_event = threading.Event()
+    
+    def request_stop(signum, frame) -> None:
+        logger.info(f"Sinal {signum} recebido, encerrando")
+        stop_event.set()
+    
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+    
+    # SIGUSR1 alterna o rastreamento; a troca é feita fora do tratador de sinal
+    toggle_event = threading.Event()
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: toggle_event.set())
+    
+    try:
+        while not stop_event.wait(1):
+            if toggle_event.is_set():
+                toggle_event.clear()
+                event_handler.toggle_tracing()
+    finally:
+        observer.stop()
+        observer.join()
+        event_handler.close()
+        logger.info("Monitoramento parado")
+        if log_listener is not None:
+            log_listener.stop()
+
+def run_gui() -> None:
+    """Inicializa a aplicação com interface gráfica."""
+    load_gui()
     root = ctk.CTk()
     app = EmailAutomationApp(root)
     root.mainloop()
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Ponto de entrada: interface gráfica (padrão) ou modo servidor ("serve")."""
+    parser = argparse.ArgumentParser(description="Automação de envio de emails com PDF")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("gui", help="Abre a interface gráfica (padrão)")
+    serve_parser = subparsers.add_parser("serve", help="Executa o monitoramento sem interface gráfica")
+    serve_parser.add_argument("--config", help="Arquivo JSON de configurações")
+    args = parser.parse_args(argv)
+    
+    if args.command == "serve":
+        try:
+            settings = load_settings(args.config)
+        except (OSError, ValueError) as e:
+            print(f"Erro nas configurações: {str(e)}", file=sys.stderr)
+            return 2
+        run_headless(settings)
+    else:
+        run_gui()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
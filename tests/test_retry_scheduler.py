@@ -0,0 +1,76 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+
+def test_retry_is_offered_again_while_file_is_busy(tmp_path, monkeypatch):
+    """Uma tentativa vencida enquanto o worker ainda segura o arquivo não pode se perder."""
+    monkeypatch.setattr(main.RetryScheduler, "BUSY_DELAY", 0.05)
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(b"%PDF-1.4")
+
+    busy = threading.Event()
+    busy.set()
+    accepted = threading.Event()
+    offers = []
+
+    def on_due(due_path):
+        offers.append(due_path)
+        if busy.is_set():
+            return False
+        accepted.set()
+        return True
+
+    scheduler = main.RetryScheduler(on_due)
+    scheduler.start()
+    try:
+        # Agendada já vencida, como quando o envio aos demais destinatários demora
+        scheduler.schedule(str(path), time.time() - 1)
+        time.sleep(0.2)
+        assert offers and not accepted.is_set()
+        assert scheduler.pending() == 1
+
+        busy.clear()
+        assert accepted.wait(2)
+        assert scheduler.pending() == 0
+    finally:
+        scheduler.stop(timeout=2)
+
+
+def test_enqueue_of_pending_file_is_rescheduled(tmp_path, monkeypatch):
+    """enqueue recusa um arquivo em processamento; o agendador tenta de novo depois."""
+    monkeypatch.setattr(main.RetryScheduler, "BUSY_DELAY", 0.05)
+    monitor = tmp_path / "entrada"
+    monitor.mkdir()
+    path = monitor / "doc.pdf"
+    path.write_bytes(b"%PDF-1.4")
+
+    handler = main.PDFHandler(
+        smtp_server="127.0.0.1", smtp_port=25, email="remetente@exemplo.com", password="",
+        monitor_folder=str(monitor), sent_folder=str(tmp_path / "enviados"),
+        error_folder=str(tmp_path / "erros"), email_template=main.DEFAULT_EMAIL_TEMPLATE,
+        error_template=main.DEFAULT_ERROR_TEMPLATE, update_stats_callback=lambda *a: None,
+        logger=main.logging.getLogger("test"), extraction_processes=0)
+    try:
+        # Simula o worker que ainda não liberou o arquivo ao agendar a nova tentativa
+        with handler._pending_lock:
+            handler._pending.add(str(path))
+        handler.retries.start()
+        handler.retries.schedule(str(path), time.time())
+        time.sleep(0.2)
+        assert handler.work_queue.qsize() == 0
+        assert handler.retries.pending() == 1
+
+        with handler._pending_lock:
+            handler._pending.discard(str(path))
+        deadline = time.time() + 2
+        while handler.work_queue.qsize() == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        assert handler.work_queue.get_nowait() == str(path)
+    finally:
+        handler.close()